@@ -12,17 +12,13 @@
 
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
-    # Load environment variables from .env
-load_dotenv()
-
-    # Print AWS credentials for debugging (remove in production)
-print("AWS_ACCESS_KEY_ID:", os.getenv("AWS_ACCESS_KEY_ID"))
-print("AWS_SECRET_ACCESS_KEY:", os.getenv("AWS_SECRET_ACCESS_KEY"))
-print("AWS_REGION:", os.getenv("AWS_REGION"))
+    # Load environment variables from .env (python-dotenv is only imported if there is one)
+if os.path.exists(os.path.join(BASE_DIR, ".env")):
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(BASE_DIR, ".env"))
 
     # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -64,6 +60,7 @@ INSTALLED_APPS = [
     ]
 
 MIDDLEWARE = [
+        'invoices.middleware.ServerTimingMiddleware',
         'django.middleware.security.SecurityMiddleware',
         'django.contrib.sessions.middleware.SessionMiddleware',
         'django.middleware.common.CommonMiddleware',
@@ -97,9 +94,33 @@ DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Writers queue for the lock at BEGIN instead of failing with
+            # "database is locked" when two transactions try to upgrade at once
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # A file, not shared-cache memory, so the concurrency tests lock
+            # the way the real database does instead of failing with "table is locked"
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
+    # Caches: rendered invoice PDFs are shared by all workers on the host
+CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'invoice_pdfs': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'pdf_cache',
+            'TIMEOUT': 7 * 24 * 60 * 60,
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        },
+    }
+
     # Password validation
 AUTH_PASSWORD_VALIDATORS = [
         {
@@ -145,3 +166,67 @@ AWS_REGION = os.getenv("AWS_REGION")
 import os
 
 WKHTMLTOPDF_CMD = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
+
+# Textract result cache (see invoices/textract_cache.py)
+TEXTRACT_CACHE = {
+    "PATH": os.path.join(BASE_DIR, "textract_cache.sqlite3"),
+    "MAX_BYTES": 256 * 1024 * 1024,
+    "MEMORY_BYTES": 8 * 1024 * 1024,  # compressed responses kept in each process
+}
+
+# Concurrent Textract calls for /api/invoices/extract/batch/
+TEXTRACT_BATCH_WORKERS = 8
+
+# Largest scan accepted by the extract endpoints, in bytes
+INVOICE_UPLOAD_MAX_BYTES = 25 * 1024 * 1024
+
+# wkhtmltopdf concurrency cap (see invoices/rendering.py); WORKERS=None uses one per core
+PDF_RENDERER = {
+    "WORKERS": None,
+    "MAX_PENDING": 64,
+    "TIMEOUT": 60,
+}
+
+# Bulk PDF archive export (invoices/archive.py)
+PDF_ARCHIVE = {
+    "WORKERS": None,
+    "MAX_IN_FLIGHT": None,
+    "CHUNK_SIZE": 200,
+}
+
+# Textract client (invoices/clients.py), built on first use in each process
+TEXTRACT_CLIENT = {
+    "MAX_POOL_CONNECTIONS": None,
+    "CONNECT_TIMEOUT": 5,
+    "READ_TIMEOUT": 60,
+    "MAX_ATTEMPTS": 5,
+    "RETRY_MODE": "adaptive",
+}
+
+# Image normalization before Textract (invoices/preprocess.py). Changing these
+# starts a fresh set of Textract cache entries.
+TEXTRACT_PREPROCESS = {
+    "ENABLED": True,
+    "TARGET_DPI": 200,
+    "GRAYSCALE": True,
+    "QUALITY": 80,
+}
+
+# Multi-page PDF/TIFF uploads are split and their pages analyzed in parallel
+# (invoices/pages.py); splitting PDFs needs pypdf
+TEXTRACT_PAGES = {
+    "WORKERS": 8,
+    "MAX_PAGES": 50,
+}
+
+# Thread pool the async views use for boto3 / wkhtmltopdf / ReportLab calls (invoices/offload.py)
+ASYNC_OFFLOAD = {
+    "WORKERS": 200,
+}
+
+# Stored results of `manage.py run_benchmarks --save-baseline`
+BENCHMARK_BASELINE = BASE_DIR / "benchmarks" / "baseline.json"
+
+# Invoice numbers each worker reserves per database round trip. Numbers left in
+# a block when a worker exits are skipped, so values above 1 allow gaps.
+INVOICE_NO_BLOCK_SIZE = 10
@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from invoices.api_views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/invoices/', include('invoices.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -1,49 +1,35 @@
 import os
-import uuid
 from datetime import datetime, date
-from io import BytesIO
 
 from django.conf import settings
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-from django.http import HttpResponse, JsonResponse
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.template.loader import render_to_string
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 
-import boto3
-import pdfkit
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
+from . import archive, export, metrics, pdf_cache
+from .batch import create_job, job_status, submit_job
+from .clients import get_textract_client
+from .importer import import_invoices
+from .item_sync import clean_item
+from .models import ExtractionJob, Invoice, Item, generate_invoice_no
+from .pages import TooManyPages, extract_document
+from .pagination import InvoiceKeysetPagination
+from .search import search_invoices
+from .serializers import InvoiceFilterSerializer, InvoiceSerializer
+from .letterhead import LETTERHEAD_PATH
+from .metrics import timing
+from .rendering import RendererBusy, render_pdf
+from .uploads import UploadTooLarge, store_upload, template_fields
 
-from .models import Invoice, Item, generate_invoice_no
-
-
-# -----------------------------
-# AWS Textract setup
-# -----------------------------
-textract_client = boto3.client(
-    "textract",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION"),
-)
-
-
-# -----------------------------
-# Utility
-# -----------------------------
-def safe_float(value, default=0.0):
-    try:
-        return float(value)
-    except (ValueError, TypeError):
-        return default
 
 
 # -----------------------------
@@ -57,106 +43,49 @@ def extract_invoice(request):
     if not uploaded_file:
         return Response({"error": "No file uploaded"}, status=400)
 
-    fname = uploaded_file.name
-    ext = os.path.splitext(fname)[1]
-    unique_name = f"{os.path.splitext(fname)[0]}_{uuid.uuid4().hex}{ext}"
-    save_path = os.path.join("invoice_templates", unique_name)
-    path_on_disk = default_storage.save(save_path, ContentFile(uploaded_file.read()))
-    file_bytes = default_storage.open(path_on_disk).read()
+    try:
+        upload = store_upload(uploaded_file)
+    except UploadTooLarge as e:
+        return Response({"error": str(e)}, status=413)
 
     try:
-        response = textract_client.analyze_document(
-            Document={"Bytes": file_bytes},
-            FeatureTypes=["TABLES", "FORMS"],
-        )
+        invoice_data = extract_document(get_textract_client(), upload.data, digest=upload.digest)
+    except TooManyPages as e:
+        return Response({"error": str(e)}, status=413)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
-    invoice_data = {
-        "invoice_no": "",
-        "invoice_date": "",
-        "vat_date": "",
-        "customer_name": "",
-        "customer_address": "",
-        "contract_no": "",
-        "po_no": "",
-        "items": [],
-        "subtotal": 0,
-        "vat": 0,
-        "total": 0,
-        "template_url": settings.MEDIA_URL + save_path,
-        "template_path": save_path,
-    }
-
-    # Parse key/value fields
-    for block in response.get("Blocks", []):
-        if block.get("BlockType") == "KEY_VALUE_SET" and "KEY" in block.get("EntityTypes", []):
-            key_text, value_text = "", ""
-            for rel in block.get("Relationships", []) or []:
-                for rid in rel.get("Ids", []):
-                    b = next((bb for bb in response["Blocks"] if bb["Id"] == rid), None)
-                    if b and b.get("BlockType") == "WORD":
-                        key_text += b.get("Text", "") + " "
-                    if b and b.get("BlockType") == "VALUE":
-                        value_text += b.get("Text", "") + " "
-            key_text, value_text = key_text.strip().lower(), value_text.strip()
-            if "invoice no" in key_text:
-                invoice_data["invoice_no"] = value_text
-            elif "invoice date" in key_text:
-                invoice_data["invoice_date"] = value_text
-            elif "vat date" in key_text:
-                invoice_data["vat_date"] = value_text
-            elif "customer" in key_text and "sold" in key_text:
-                invoice_data["customer_name"] = value_text
-            elif "address" in key_text:
-                invoice_data["customer_address"] = value_text
-            elif "contract" in key_text:
-                invoice_data["contract_no"] = value_text
-            elif "po" in key_text:
-                invoice_data["po_no"] = value_text
-
-    # Parse table rows
-    rows = []
-    for block in response.get("Blocks", []):
-        if block.get("BlockType") == "TABLE":
-            for rel in block.get("Relationships", []) or []:
-                if rel.get("Type") == "CHILD":
-                    for cid in rel.get("Ids", []):
-                        cell = next((b for b in response["Blocks"] if b.get("Id") == cid), None)
-                        if cell and cell.get("BlockType") == "CELL":
-                            cell_text = ""
-                            for r in cell.get("Relationships", []) or []:
-                                for wid in r.get("Ids", []):
-                                    word = next((b for b in response["Blocks"] if b.get("Id") == wid), None)
-                                    if word and word.get("BlockType") == "WORD":
-                                        cell_text += word.get("Text", "") + " "
-                            rows.append(cell_text.strip())
-
-    for r in range(0, len(rows), 4):
-        if r + 3 < len(rows):
-            invoice_data["items"].append(
-                {
-                    "description": rows[r],
-                    "unit": rows[r + 1],
-                    "qty": safe_float(rows[r + 2]),
-                    "unit_rate": safe_float(rows[r + 3]),
-                }
-            )
-
-    subtotal = sum(i["qty"] * i["unit_rate"] for i in invoice_data["items"])
-    vat = round(subtotal * 0.075, 2)
-    total = round(subtotal + vat, 2)
-
-    invoice_data["subtotal"] = subtotal
-    invoice_data["vat"] = vat
-    invoice_data["total"] = total
-    invoice_data["invoice_date"] = invoice_data["invoice_date"] or datetime.now().date().isoformat()
-    invoice_data["vat_date"] = invoice_data["vat_date"] or invoice_data["invoice_date"]
-    invoice_data["invoice_no"] = invoice_data["invoice_no"] or f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    invoice_data.update(template_fields(upload.path))
 
     return Response(invoice_data)
 
 
+# -----------------------------
+# 1️⃣b Batch extraction (background Textract calls + polling)
+# -----------------------------
+@csrf_exempt
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def extract_invoice_batch(request):
+    uploaded_files = request.FILES.getlist("files")
+    if not uploaded_files:
+        return Response({"error": "No files uploaded"}, status=400)
+
+    job = create_job(uploaded_files)
+    submit_job(job, get_textract_client())
+    return Response(
+        {"job_id": str(job.id), "total": len(uploaded_files)},
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def extract_batch_status(request, job_id):
+    job = get_object_or_404(ExtractionJob, pk=job_id)
+    return Response(job_status(job))
+
+
 # -----------------------------
 # 2️⃣ Save + Generate PDF (ReportLab)
 # -----------------------------
@@ -179,38 +108,16 @@ def save_invoice(request):
             template_image=default_template,
         )
 
-        for item in data.get("items", []):
-            Item.objects.create(
-                invoice=invoice,
-                description=item.get("description", ""),
-                unit=item.get("unit", ""),
-                qty=item.get("qty", 0),
-                unit_rate=item.get("unit_rate", 0),
-            )
-
-        invoice.calculate_totals()
-
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        bg_path = os.path.join(settings.BASE_DIR, "invoices", "static", "invoices", "ISMADTECHNICAL_TEMPLATE.jpg")
-
-        if os.path.exists(bg_path):
-            bg = ImageReader(bg_path)
-            p.drawImage(bg, 0, 0, width=width, height=height, preserveAspectRatio=True, mask="auto")
-
-        p.setFont("Helvetica", 10)
-        p.drawString(400, 800, f"Invoice No: {invoice.invoice_no}")
-        p.drawString(400, 785, f"Invoice Date: {invoice.invoice_date}")
-        p.drawString(50, 750, f"Customer: {invoice.customer_name}")
-        p.drawString(50, 735, f"Address: {invoice.customer_address}")
-        p.drawString(400, 100, f"Subtotal: {invoice.subtotal:,.2f}")
-        p.drawString(400, 85, f"VAT (7.5%): {invoice.vat:,.2f}")
-        p.drawString(400, 70, f"Total: {invoice.total:,.2f}")
-
-        p.showPage()
-        p.save()
-        buffer.seek(0)
+        # Converted the way the columns store them, so the in-memory totals match the rows
+        items = Item.objects.bulk_create(
+            Item(invoice=invoice, **clean_item(item)) for item in data.get("items", [])
+        )
+
+        invoice.calculate_totals(items)
+
+        from .utils import generate_letterhead_pdf  # ReportLab is only loaded once a PDF is needed
+
+        buffer = generate_letterhead_pdf(invoice)
 
         response = HttpResponse(buffer, content_type="application/pdf")
         response["Content-Disposition"] = f'attachment; filename="{invoice.invoice_no}.pdf"'
@@ -221,96 +128,246 @@ def save_invoice(request):
 
 
 # -----------------------------
-# 3️⃣ Create & Download invoice with pdfkit (wkhtmltopdf)
+# 2️⃣c Bulk import (many invoices with items, one transaction)
+# -----------------------------
+@csrf_exempt
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def bulk_import_invoices(request):
+    records = request.data.get("invoices") if isinstance(request.data, dict) else request.data
+    if not isinstance(records, list):
+        return Response({"error": "Expected a list of invoices"}, status=400)
+
+    result = import_invoices(records)
+    result["created_count"] = len(result["created"])
+    result["error_count"] = len(result["errors"])
+    return Response(result, status=status.HTTP_201_CREATED if result["created"] else 400)
+
+
+# -----------------------------
+# 2️⃣d List / filter saved invoices (keyset pagination)
+# -----------------------------
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def list_invoices(request):
+    filters = InvoiceFilterSerializer(data=request.query_params)
+    filters.is_valid(raise_exception=True)
+
+    # Two queries per page whatever the page number: the invoices and their items
+    paginator = InvoiceKeysetPagination()
+    page = paginator.paginate_queryset(filters.filter(Invoice.objects.all()), request)
+    prefetch_related_objects(page, "items")
+    return paginator.get_paginated_response(InvoiceSerializer(page, many=True).data)
+
+
+# -----------------------------
+# 2️⃣e Full-text search (customer name/address, item descriptions)
+# -----------------------------
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def search_invoices_view(request):
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"error": "Missing search query 'q'"}, status=400)
+    try:
+        limit = int(request.query_params.get("limit", 50))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+
+    invoices = search_invoices(query, limit)
+    results = InvoiceSerializer(invoices, many=True).data
+    for row, invoice in zip(results, invoices):
+        row["score"] = invoice.score
+    return Response({"query": query, "count": len(results), "results": results})
+
+
+# -----------------------------
+# 2️⃣b Download a saved invoice's PDF (cached, ETag / 304)
+# -----------------------------
+# Plain Django view: DRF content negotiation would reject "Accept: application/pdf"
+@require_GET
+def invoice_pdf(request, invoice_no):
+    invoice = get_object_or_404(Invoice, invoice_no=invoice_no)
+
+    etag = pdf_cache.current_etag(invoice)
+    if etag is not None and etag_matches(request, etag):
+        return not_modified(etag)
+
+    prefetch_related_objects([invoice], "items")
+    etag, pdf = pdf_cache.get_invoice_pdf(invoice)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response = HttpResponse(pdf, content_type="application/pdf")
+    response["ETag"] = f'"{etag}"'
+    response["Cache-Control"] = "private, no-cache"
+    response["Content-Disposition"] = f'inline; filename="{invoice.invoice_no}.pdf"'
+    return response
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    tags = parse_etags(if_none_match)
+    return "*" in tags or f'"{etag}"' in tags
+
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    response["ETag"] = f'"{etag}"'
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# -----------------------------
+# 2️⃣f Ledger export (streamed CSV / JSON lines, optional gzip)
+# -----------------------------
+@require_GET
+def export_invoices(request):
+    fmt = request.GET.get("format", "csv")
+    if fmt not in export.FORMATS:
+        return JsonResponse({"error": f"format must be one of {sorted(export.FORMATS)}"}, status=400)
+    filters = InvoiceFilterSerializer(data=request.GET)
+    if not filters.is_valid():
+        return JsonResponse(filters.errors, status=400)
+    use_gzip = request.GET.get("gzip") in ("1", "true")
+
+    content_type, extension = export.FORMATS[fmt]
+    filename = f"invoices.{extension}" + (".gz" if use_gzip else "")
+    response = StreamingHttpResponse(
+        export.export_stream(fmt, filters.filter(Invoice.objects.all()), gzip=use_gzip),
+        content_type="application/gzip" if use_gzip else f"{content_type}; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+# -----------------------------
+# 2️⃣g Bulk PDF archive (rendered in parallel, streamed as a ZIP)
 # -----------------------------
-WKHTMLTOPDF_PATH = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
-if os.path.exists(WKHTMLTOPDF_PATH):
-    PDFKIT_CONFIG = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH)
-else:
-    PDFKIT_CONFIG = pdfkit.configuration()
+@csrf_exempt
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def export_invoice_pdfs(request):
+    if not isinstance(request.data, dict):
+        return Response({"error": "Expected an object with invoice_nos or date_from / date_to"}, status=400)
+    invoice_nos = request.data.get("invoice_nos")
+    filters = InvoiceFilterSerializer(data={k: v for k, v in request.data.items() if k != "invoice_nos"})
+    filters.is_valid(raise_exception=True)
+    if invoice_nos is None and not filters.validated_data:
+        return Response({"error": "Give invoice_nos or a date range (date_from / date_to)"}, status=400)
+    if invoice_nos is not None and not isinstance(invoice_nos, list):
+        return Response({"error": "invoice_nos must be a list"}, status=400)
+
+    queryset = filters.filter(Invoice.objects.all())
+    missing = []
+    if invoice_nos is not None:
+        queryset = queryset.filter(invoice_no__in=invoice_nos)
+        found = set(queryset.values_list("invoice_no", flat=True))
+        missing = [no for no in invoice_nos if no not in found]
+
+    response = StreamingHttpResponse(archive.stream_archive(queryset, missing), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="invoices-{date.today().isoformat()}.zip"'
+    return response
 
 
+# -----------------------------
+# 3️⃣ Create & Download invoice with pdfkit (wkhtmltopdf)
+# -----------------------------
 @csrf_exempt
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def create_and_download_invoice(request):
     try:
-        data = request.data or {}
+        invoice, context = create_invoice_for_template(request.data or {})
+        pdf_bytes = render_template_pdf(context)
+        response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response["Content-Disposition"] = f'attachment; filename="{invoice.invoice_no}.pdf"'
+        return response
 
-        # ✅ Correct absolute path for your image
-        abs_path = os.path.join(
-            settings.BASE_DIR, "invoices", "static", "invoices", "ISMADTECHNICAL_TEMPLATE.jpg"
-        )
+    except RendererBusy as e:
+        return Response({"error": str(e)}, status=503)
+    except Exception as e:
+        return Response({"error": str(e)}, status=400)
 
-        if not os.path.exists(abs_path):
-            raise FileNotFoundError(
-                f"Template not found at {abs_path}. Make sure ISMADTECHNICAL_TEMPLATE.jpg is inside invoices/static/invoices/"
-            )
 
-        invoice_no = data.get("invoice_no") or generate_invoice_no()
-        invoice = Invoice.objects.create(
-            invoice_no=invoice_no,
-            customer_name=data.get("customer_name", ""),
-            customer_address=data.get("customer_address", ""),
-            contract_no=data.get("contract_no", ""),
-            po_no=data.get("po_no", ""),
-            invoice_date=data.get("invoice_date") or date.today(),
-            vat_date=data.get("vat_date") or date.today(),
-            template_image=f"invoice_templates/{os.path.basename(abs_path)}",
+def create_invoice_for_template(data):
+    """Save the invoice and its items; returns (invoice, template context). Shared with async_views."""
+    # ✅ Correct absolute path for your image
+    abs_path = LETTERHEAD_PATH
+
+    if not os.path.exists(abs_path):
+        raise FileNotFoundError(
+            f"Template not found at {abs_path}. Make sure ISMADTECHNICAL_TEMPLATE.jpg is inside invoices/static/invoices/"
         )
 
-        for it in data.get("items", []):
-            Item.objects.create(
-                invoice=invoice,
-                description=it.get("description", ""),
-                unit=it.get("unit", ""),
-                qty=int(it.get("qty", 0)),
-                unit_rate=float(it.get("unit_rate", 0.0)),
-            )
-
-        invoice.calculate_totals()
-
-        items_for_template = [
-            {
-                "sn": idx,
-                "description": it.description,
-                "unit": it.unit,
-                "qty": it.qty,
-                "rate": it.unit_rate,
-                "amount": it.total_price(),
-            }
-            for idx, it in enumerate(invoice.items.all(), start=1)
-        ]
-
-        context = {
-            "tin_no": getattr(settings, "COMPANY_TIN", "19839807-0001"),
-            "vat_date": invoice.vat_date,
-            "invoice_no": invoice.invoice_no,
-            "invoice_date": invoice.invoice_date,
-            "customer_name": invoice.customer_name,
-            "customer_address": invoice.customer_address,
-            "items": items_for_template,
-            "subtotal": invoice.subtotal,
-            "vat": invoice.vat,
-            "total": invoice.total,
-            "template_image": "file:///" + abs_path.replace("\\", "/"),
+    invoice_no = data.get("invoice_no") or generate_invoice_no()
+    invoice = Invoice.objects.create(
+        invoice_no=invoice_no,
+        customer_name=data.get("customer_name", ""),
+        customer_address=data.get("customer_address", ""),
+        contract_no=data.get("contract_no", ""),
+        po_no=data.get("po_no", ""),
+        invoice_date=data.get("invoice_date") or date.today(),
+        vat_date=data.get("vat_date") or date.today(),
+        template_image=f"invoice_templates/{os.path.basename(abs_path)}",
+    )
+
+    items = Item.objects.bulk_create(
+        Item(
+            invoice=invoice,
+            description=it.get("description", ""),
+            unit=it.get("unit", ""),
+            qty=int(it.get("qty", 0)),
+            unit_rate=float(it.get("unit_rate", 0.0)),
+        )
+        for it in data.get("items", [])
+    )
+
+    invoice.calculate_totals(items)
+    return invoice, invoice_template_context(invoice, items)
+
+
+def invoice_template_context(invoice, items):
+    """Context for invoices/invoice_template.html. Shared with views.GenerateInvoicePdfView."""
+    items_for_template = [
+        {
+            "sn": idx,
+            "description": it.description,
+            "unit": it.unit,
+            "qty": it.qty,
+            "rate": it.unit_rate,
+            "amount": it.total_price(),
         }
+        for idx, it in enumerate(items, start=1)
+    ]
+
+    context = {
+        "tin_no": getattr(settings, "COMPANY_TIN", "19839807-0001"),
+        "vat_date": invoice.vat_date,
+        "invoice_no": invoice.invoice_no,
+        "invoice_date": invoice.invoice_date,
+        "customer_name": invoice.customer_name,
+        "customer_address": invoice.customer_address,
+        "items": items_for_template,
+        "subtotal": invoice.subtotal,
+        "vat": invoice.vat,
+        "total": invoice.total,
+        "template_image": "file:///" + LETTERHEAD_PATH.replace("\\", "/"),
+    }
+    return context
+
 
+def render_template_pdf(context):
+    with timing("template"):
         html = render_to_string("invoices/invoice_template.html", context)
-        options = {
-            "enable-local-file-access": None,
-            "margin-top": "0mm",
-            "margin-bottom": "0mm",
-            "margin-left": "0mm",
-            "margin-right": "0mm",
-            "page-size": "A4",
-        }
+    return render_pdf(html)
 
-        pdf_bytes = pdfkit.from_string(html, False, configuration=PDFKIT_CONFIG, options=options)
-        response = HttpResponse(pdf_bytes, content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="{invoice.invoice_no}.pdf"'
-        return response
-    
-    except Exception as e:
-        return Response({"error": str(e)}, status=400)
 
+# -----------------------------
+# 4️⃣ Prometheus metrics (per worker process)
+# -----------------------------
+@require_GET
+def metrics_view(request):
+    return HttpResponse(metrics.expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class InvoicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'invoices'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .metrics import install_db_timer
+
+        connection_created.connect(install_db_timer, dispatch_uid="invoices.metrics.install_db_timer")
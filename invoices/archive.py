@@ -0,0 +1,209 @@
+# invoices/archive.py
+# Bulk PDF export: many invoices rendered in parallel and streamed as one ZIP.
+#
+# Invoices are read in chunks with their items prefetched and pickled to a
+# pool of spawned worker processes, which run generate_invoice_pdf without
+# touching the database. Finished PDFs are written into a ZipFile on an
+# unseekable sink and handed to the response straight away, and at most
+# MAX_IN_FLIGHT renders are outstanding, so memory stays bounded however
+# many invoices are selected. Jobs lost when a worker dies are resubmitted
+# to a fresh pool; failures are listed in manifest.json.
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+
+
+DEFAULTS = {
+    "WORKERS": None,       # None: one per CPU core
+    "MAX_IN_FLIGHT": None,  # None: two per worker
+    "CHUNK_SIZE": 200,     # invoices (with items) fetched per query
+}
+
+
+def _render(invoice):
+    # Runs in a pool worker; items are prefetched so this makes no queries
+    from .utils import generate_invoice_pdf
+
+    return generate_invoice_pdf(invoice).getvalue()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def options():
+    return {**DEFAULTS, **getattr(settings, "PDF_ARCHIVE", {})}
+
+
+def worker_count():
+    return options()["WORKERS"] or os.cpu_count() or 2
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=worker_count(),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    # Workers unpickle model instances, so the app registry must be ready
+                    initializer=django.setup,
+                )
+    return _executor
+
+
+def reset_executor(broken=None):
+    """Drop the shared pool (only if it is still `broken`, when given) so the next caller starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None and (broken is None or _executor is broken):
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def archive_name(invoice_no, used):
+    """A file name for the invoice not yet in `used` (and add it): "A/1" and "A-1" must not collide."""
+    stem = invoice_no.replace("/", "-")
+    name, n = f"{stem}.pdf", 1
+    while name in used:
+        n += 1
+        name = f"{stem}-{n}.pdf"
+    used.add(name)
+    return name
+
+
+class _Renders:
+    """
+    The renders in flight. When a worker dies the whole pool is broken and
+    every job in it is lost. Those jobs are retried on a fresh pool one at a
+    time, so only an invoice that crashes a worker on its own (the one that
+    killed the pool) is reported failed.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor or get_executor()
+        self.pending = {}  # future -> (invoice, executor it was submitted to)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def submit(self, invoice):
+        try:
+            future = self.executor.submit(_render, invoice)
+        except BrokenProcessPool:
+            self.replace_executor(self.executor)
+            future = self.executor.submit(_render, invoice)
+        self.pending[future] = (invoice, self.executor)
+        return future
+
+    def replace_executor(self, broken):
+        if self.executor is broken:
+            reset_executor(broken)
+            self.executor = get_executor()
+
+    def collect(self, return_when):
+        """Yield (invoice_no, pdf_bytes, error) for the renders that finish next."""
+        done, _ = wait(self.pending, return_when=return_when)
+        lost, broken = [], None
+        for future in done:
+            invoice, executor = self.pending.pop(future)
+            try:
+                yield invoice.invoice_no, future.result(), None
+            except BrokenProcessPool:
+                lost.append(invoice)
+                broken = executor
+            except Exception as e:
+                yield invoice.invoice_no, None, f"{type(e).__name__}: {e}"
+        if broken is None:
+            return
+
+        # Jobs still queued on the broken pool are lost with it
+        for future, (invoice, executor) in list(self.pending.items()):
+            if executor is broken:
+                del self.pending[future]
+                lost.append(invoice)
+        self.replace_executor(broken)
+        for invoice in lost:
+            future = self.submit(invoice)
+            invoice, executor = self.pending.pop(future)
+            try:
+                yield invoice.invoice_no, future.result(), None
+            except BrokenProcessPool:
+                self.replace_executor(executor)
+                yield invoice.invoice_no, None, "PDF worker crashed"
+            except Exception as e:
+                yield invoice.invoice_no, None, f"{type(e).__name__}: {e}"
+
+
+def render_all(queryset, executor=None):
+    """
+    Yield (invoice_no, pdf_bytes, error) as renders finish, in completion order.
+
+    Keeps at most MAX_IN_FLIGHT invoices submitted at a time.
+    """
+    opts = options()
+    max_in_flight = opts["MAX_IN_FLIGHT"] or 2 * worker_count()
+    invoices = queryset.order_by("id").prefetch_related("items").iterator(chunk_size=opts["CHUNK_SIZE"])
+
+    renders = _Renders(executor)
+    for invoice in invoices:
+        renders.submit(invoice)
+        if len(renders) >= max_in_flight:
+            yield from renders.collect(FIRST_COMPLETED)
+    while len(renders):
+        yield from renders.collect(FIRST_COMPLETED)
+
+
+class _Sink:
+    """Write-only, unseekable file object; ZipFile then streams with data descriptors."""
+
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, data):
+        self.pieces.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.pieces)
+        self.pieces = []
+        return data
+
+
+def stream_archive(queryset, missing=(), executor=None):
+    """Iterator of bytes for a ZIP holding one PDF per invoice plus manifest.json."""
+    sink = _Sink()
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "invoices": [],
+        "failed": [],
+        "missing": list(missing),
+    }
+    names = set()
+    # PDF page streams are already compressed, so entries are stored as is
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for invoice_no, pdf, error in render_all(queryset, executor):
+            if error is None:
+                name = archive_name(invoice_no, names)
+                archive.writestr(name, pdf)
+                manifest["invoices"].append({"invoice_no": invoice_no, "file": name, "bytes": len(pdf)})
+            else:
+                manifest["failed"].append({"invoice_no": invoice_no, "error": error})
+            data = sink.drain()
+            if data:
+                yield data
+        manifest["count"] = len(manifest["invoices"])
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    yield sink.drain()
@@ -0,0 +1,95 @@
+# invoices/async_views.py
+# Async versions of the extract and PDF endpoints, for running under ASGI.
+#
+# Plain Django async views (DRF views are sync only). Blocking library calls
+# go to the offload pool (offload.run_blocking) and ORM work through
+# sync_to_async, so the event loop is free while Textract, wkhtmltopdf or
+# ReportLab are busy and one worker can serve hundreds of requests at once.
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import prefetch_related_objects
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from . import pdf_cache
+from .api_views import create_invoice_for_template, etag_matches, not_modified, render_template_pdf
+from .clients import get_textract_client
+from .models import Invoice
+from .offload import run_blocking
+from .pages import extract_document
+from .rendering import RendererBusy
+from .uploads import UploadTooLarge, store_upload, template_fields
+
+
+def extract(uploaded_file):
+    # Runs on the offload pool, whose threads Django's request signals never
+    # reach: store_upload() registers the blob through the ORM, so the
+    # thread's connection is checked here the way batch.process_file does
+    close_old_connections()
+    try:
+        upload = store_upload(uploaded_file)
+        invoice_data = extract_document(get_textract_client(), upload.data, digest=upload.digest)
+        invoice_data.update(template_fields(upload.path))
+        return invoice_data
+    finally:
+        close_old_connections()
+
+
+@csrf_exempt
+@require_POST
+async def extract_invoice(request):
+    uploaded_file = request.FILES.get("file")
+    if not uploaded_file:
+        return JsonResponse({"error": "No file uploaded"}, status=400)
+    try:
+        return JsonResponse(await run_blocking(extract, uploaded_file))
+    except UploadTooLarge as e:
+        return JsonResponse({"error": str(e)}, status=413)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@require_GET
+async def invoice_pdf(request, invoice_no):
+    try:
+        invoice = await Invoice.objects.aget(invoice_no=invoice_no)
+    except Invoice.DoesNotExist:
+        raise Http404("No Invoice matches the given query.")
+
+    etag = await run_blocking(pdf_cache.current_etag, invoice)
+    if etag is not None and etag_matches(request, etag):
+        return not_modified(etag)
+
+    await sync_to_async(prefetch_related_objects)([invoice], "items")
+    etag, pdf = await run_blocking(pdf_cache.get_invoice_pdf, invoice)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    response = HttpResponse(pdf, content_type="application/pdf")
+    response["ETag"] = f'"{etag}"'
+    response["Cache-Control"] = "private, no-cache"
+    response["Content-Disposition"] = f'inline; filename="{invoice.invoice_no}.pdf"'
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def create_and_download_invoice(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    try:
+        invoice, context = await sync_to_async(create_invoice_for_template)(data)
+        pdf_bytes = await run_blocking(render_template_pdf, context)
+    except RendererBusy as e:
+        return JsonResponse({"error": str(e)}, status=503)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    response = HttpResponse(pdf_bytes, content_type="application/pdf")
+    response["Content-Disposition"] = f'attachment; filename="{invoice.invoice_no}.pdf"'
+    return response
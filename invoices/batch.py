@@ -0,0 +1,110 @@
+# invoices/batch.py
+# Background Textract extraction for batches of uploaded scans.
+#
+# Files are stored and recorded as ExtractionJobFile rows up front; the
+# Textract calls then run on a bounded, process-wide thread pool and write
+# their results back to the row, which the polling endpoint reads.
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ExtractionJob, ExtractionJobFile
+from .pages import extract_document
+from .uploads import UploadTooLarge, store_upload, template_fields
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "TEXTRACT_BATCH_WORKERS", 8),
+                    thread_name_prefix="textract-batch",
+                )
+    return _executor
+
+
+def create_job(uploaded_files):
+    job = ExtractionJob.objects.create()
+    job_files = []
+    for f in uploaded_files:
+        job_file = ExtractionJobFile(job=job, name=f.name)
+        try:
+            # Workers read the file back from storage, so don't hold 500 scans in memory
+            job_file.template_path = store_upload(f, keep_data=False).path
+        except UploadTooLarge as e:
+            job_file.status = ExtractionJobFile.FAILED
+            job_file.error = str(e)
+            job_file.finished_at = timezone.now()
+        job_files.append(job_file)
+    ExtractionJobFile.objects.bulk_create(job_files)
+    return job
+
+
+def submit_job(job, client, executor=None):
+    """Queue every pending file of `job`; returns the futures."""
+    executor = executor or get_executor()
+    file_ids = job.files.filter(status=ExtractionJobFile.PENDING).values_list("id", flat=True)
+    return [executor.submit(process_file, file_id, client) for file_id in file_ids]
+
+
+def process_file(file_id, client):
+    """Run one file through Textract and store the result on its row."""
+    close_old_connections()
+    try:
+        job_file = ExtractionJobFile.objects.get(pk=file_id)
+        job_file.status = ExtractionJobFile.RUNNING
+        job_file.save(update_fields=["status"])
+
+        try:
+            with default_storage.open(job_file.template_path) as fh:
+                file_bytes = fh.read()
+            result = extract_document(client, file_bytes)
+            result.update(template_fields(job_file.template_path))
+        except Exception as e:
+            job_file.status = ExtractionJobFile.FAILED
+            job_file.error = str(e)
+        else:
+            job_file.status = ExtractionJobFile.DONE
+            job_file.result = result
+
+        job_file.finished_at = timezone.now()
+        job_file.save(update_fields=["status", "result", "error", "finished_at"])
+        return job_file.status
+    finally:
+        close_old_connections()
+
+
+def job_status(job):
+    files = list(job.files.order_by("id"))
+    counts = {status: 0 for status, _ in ExtractionJobFile.STATUS_CHOICES}
+    for f in files:
+        counts[f.status] += 1
+
+    finished = counts[ExtractionJobFile.DONE] + counts[ExtractionJobFile.FAILED]
+    return {
+        "job_id": str(job.id),
+        "status": "done" if finished == len(files) else "running",
+        "created_at": job.created_at,
+        "total": len(files),
+        "counts": counts,
+        "files": [
+            {
+                "id": f.id,
+                "name": f.name,
+                "status": f.status,
+                "result": f.result,
+                "error": f.error,
+            }
+            for f in files
+        ],
+    }
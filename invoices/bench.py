@@ -0,0 +1,166 @@
+# invoices/bench.py
+# Helpers shared by the benchmark management commands.
+import random
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+def timed(fn, *args, repeat=3, **kwargs):
+    """Run fn `repeat` times and return (best_seconds, last_result)."""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+@contextmanager
+def scratch_database():
+    """Run against a throwaway test database so benchmarks never touch real data."""
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+# -----------------------------
+# Synthetic Textract responses
+# -----------------------------
+FIELD_KEYS = ["Invoice No", "Invoice Date", "VAT Date", "Customer Sold To", "Address", "Contract No", "PO No"]
+
+
+def synthetic_textract_response(n_blocks, seed=0):
+    """
+    Build an AnalyzeDocument-shaped response with roughly n_blocks blocks.
+
+    Half of the blocks are key/value pairs (KEY + VALUE + 3 WORDs), the rest
+    are cells of a 4-column line item table (CELL + WORD).
+    """
+    rng = random.Random(seed)
+    blocks = []
+    counter = iter(range(10 ** 9))
+
+    def new_id():
+        return f"b{next(counter)}"
+
+    def word(text):
+        block = {"Id": new_id(), "BlockType": "WORD", "Text": text}
+        blocks.append(block)
+        return block["Id"]
+
+    page = {"Id": new_id(), "BlockType": "PAGE", "Relationships": [{"Type": "CHILD", "Ids": []}]}
+    blocks.append(page)
+
+    kv_budget = n_blocks // 2
+    while len(blocks) < kv_budget:
+        key_words = rng.choice(FIELD_KEYS).split()[:2]
+        key_id, value_id = new_id(), new_id()
+        word_ids = [word(w) for w in key_words]
+        value_word = word(f"V{rng.randint(0, 99999)}")
+        blocks.append({
+            "Id": key_id,
+            "BlockType": "KEY_VALUE_SET",
+            "EntityTypes": ["KEY"],
+            "Relationships": [{"Type": "VALUE", "Ids": [value_id]}, {"Type": "CHILD", "Ids": word_ids}],
+        })
+        blocks.append({
+            "Id": value_id,
+            "BlockType": "KEY_VALUE_SET",
+            "EntityTypes": ["VALUE"],
+            "Relationships": [{"Type": "CHILD", "Ids": [value_word]}],
+        })
+
+    table = {"Id": new_id(), "BlockType": "TABLE", "Relationships": [{"Type": "CHILD", "Ids": []}]}
+    blocks.append(table)
+    cell_ids = table["Relationships"][0]["Ids"]
+    row = 1
+    while len(blocks) < n_blocks - 1:
+        texts = [f"Item {row}", "pcs", str(rng.randint(1, 50)), f"{rng.uniform(1, 500):.2f}"]
+        for col, text in enumerate(texts, start=1):
+            cell = {
+                "Id": new_id(),
+                "BlockType": "CELL",
+                "RowIndex": row,
+                "ColumnIndex": col,
+                "Relationships": [{"Type": "CHILD", "Ids": [word(text)]}],
+            }
+            blocks.append(cell)
+            cell_ids.append(cell["Id"])
+        row += 1
+
+    page["Relationships"][0]["Ids"] = [b["Id"] for b in blocks if b["BlockType"] in ("KEY_VALUE_SET", "TABLE")]
+    return {"DocumentMetadata": {"Pages": 1}, "Blocks": blocks}
+
+
+# -----------------------------
+# Synthetic invoices
+# -----------------------------
+def synthetic_invoice_records(count, items_per_invoice=5, seed=0):
+    """Invoice dicts in the shape accepted by the save and import endpoints."""
+    rng = random.Random(seed)
+    return [
+        {
+            "customer_name": f"Customer {rng.randint(1, 500)}",
+            "customer_address": f"{rng.randint(1, 200)} Synthetic Road",
+            "contract_no": f"C-{i}",
+            "po_no": f"PO-{i}",
+            "items": [
+                {
+                    "description": f"Line {n} of invoice {i}",
+                    "unit": "pcs",
+                    "qty": rng.randint(1, 20),
+                    "unit_rate": round(rng.uniform(1, 1000), 2),
+                }
+                for n in range(items_per_invoice)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def seed_invoices(count, items_per_invoice=5, seed=0):
+    """Save `count` synthetic invoices through the bulk importer; returns their invoice numbers."""
+    from .importer import import_invoices
+
+    result = import_invoices(synthetic_invoice_records(count, items_per_invoice, seed))
+    assert not result["errors"], result["errors"][:3]
+    return result["created"]
+
+
+# -----------------------------
+# Synthetic invoice photos
+# -----------------------------
+def synthetic_invoice_photo(width=4032, height=3024, seed=0, orientation=6, quality=95):
+    """
+    JPEG bytes resembling a phone photo of a printed invoice.
+
+    Stored landscape with an EXIF orientation tag the way phone cameras write
+    portrait shots, in colour, with sensor noise and rows of dark "text" bars.
+    """
+    import io
+
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    noise = Image.effect_noise((width, height), 12).point(lambda v: v // 4 + 170)
+    image = Image.merge("RGB", (noise, noise.point(lambda v: v + 6), noise.point(lambda v: v - 8)))
+    draw = ImageDraw.Draw(image)
+    # Text runs along the long edge before rotation (portrait page, landscape sensor)
+    line_height = max(8, width // 90)
+    for x in range(width // 12, width - width // 12, line_height * 2):
+        y = height // 12
+        while y < height - height // 12:
+            word = rng.randint(height // 60, height // 12)
+            draw.rectangle([x, y, x + line_height, min(y + word, height - height // 12)], fill=(35, 35, 45))
+            y += word + rng.randint(height // 120, height // 40)
+
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=quality, exif=exif)
+    return out.getvalue()
@@ -0,0 +1,283 @@
+# invoices/benchmarks.py
+# Benchmark cases run by `manage.py run_benchmarks`.
+#
+# Each case sets up its data and returns the callable to time. The runner
+# keeps the best of N runs plus the number of queries the last run made, and
+# compares both with a stored JSON baseline: slower than the threshold or
+# more queries than before counts as a regression.
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .bench import seed_invoices, synthetic_invoice_photo, synthetic_invoice_records, synthetic_textract_response
+
+
+CASES = {}
+
+# Timing differences below this are noise, whatever the relative change
+MIN_DELTA_SECONDS = 0.002
+
+
+class Skip(Exception):
+    pass
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _expect(response, status=200):
+    assert response.status_code == status, (response.status_code, getattr(response, "content", b"")[:200])
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def _wkhtmltopdf_available():
+    from .rendering import wkhtmltopdf_command
+
+    try:
+        wkhtmltopdf_command()
+    except OSError:
+        return False
+    return True
+
+
+class Context:
+    """Shared fixtures: a test client and a seeded set of invoices."""
+
+    def __init__(self):
+        self.client = Client()
+        self.invoice_nos = seed_invoices(200, items_per_invoice=8, seed=16)
+
+    def post_json(self, path, data):
+        return self.client.post(path, data, content_type="application/json")
+
+
+# -----------------------------
+# Startup
+# -----------------------------
+# Boot Django and load the URLconf (and so every view module) in a fresh
+# interpreter, the way manage.py commands and new workers do
+STARTUP_SCRIPT = """
+import sys
+import django
+django.setup()
+import {urlconf}
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+LAZY_MODULES = ("boto3", "botocore", "pdfkit", "reportlab", "PIL", "pypdf")
+
+
+@case("startup.django_setup_and_urls")
+def startup(ctx):
+    script = STARTUP_SCRIPT.format(urlconf=settings.ROOT_URLCONF, heavy=LAZY_MODULES)
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "invoice_system.settings")}
+
+    def run():
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        loaded = result.stdout.strip()
+        assert not loaded, f"imported at startup: {loaded}"
+    return run
+
+
+# -----------------------------
+# Extraction parsing
+# -----------------------------
+@case("textract.parse_10k_blocks")
+def textract_parse(ctx):
+    from .textract import invoice_data_from_response
+
+    response = synthetic_textract_response(10_000, seed=1)
+    return lambda: invoice_data_from_response(response)
+
+
+@case("textract.preprocess_phone_photo")
+def textract_preprocess(ctx):
+    from .preprocess import prepare
+
+    photo = synthetic_invoice_photo(seed=1)
+    return lambda: prepare(photo)
+
+
+# -----------------------------
+# PDF engines
+# -----------------------------
+@case("pdf.reportlab_letterhead")
+def pdf_letterhead(ctx):
+    from .models import Invoice
+    from .utils import generate_letterhead_pdf
+
+    invoice = Invoice.objects.get(invoice_no=ctx.invoice_nos[0])
+    return lambda: generate_letterhead_pdf(invoice)
+
+
+@case("pdf.generate_invoice_pdf_500_lines")
+def pdf_generate(ctx):
+    from .models import Invoice
+    from .utils import generate_invoice_pdf
+
+    invoice_no = seed_invoices(1, items_per_invoice=500, seed=500)[0]
+    invoice = Invoice.objects.prefetch_related("items").get(invoice_no=invoice_no)
+    return lambda: generate_invoice_pdf(invoice)
+
+
+@case("pdf.pdfkit_template")
+def pdf_pdfkit(ctx):
+    from django.template.loader import render_to_string
+
+    from .rendering import render_pdf
+
+    if not _wkhtmltopdf_available():
+        raise Skip("wkhtmltopdf not installed")
+    items = [
+        {"description": r["description"], "unit": r["unit"], "qty": r["qty"], "rate": r["unit_rate"],
+         "amount": r["qty"] * r["unit_rate"]}
+        for r in synthetic_invoice_records(1, 10, seed=2)[0]["items"]
+    ]
+    html = render_to_string("invoices/invoice_template.html", {"items": items, "invoice_no": "BENCH"})
+    render_pdf(html)  # warm-up (resolves the wkhtmltopdf command once)
+    return lambda: render_pdf(html)
+
+
+# -----------------------------
+# Endpoints (time and queries per request)
+# -----------------------------
+@case("endpoint.save_invoice")
+def endpoint_save(ctx):
+    record = synthetic_invoice_records(1, 10, seed=3)[0]
+    return lambda: _expect(ctx.post_json("/api/invoices/save/", record))
+
+
+@case("endpoint.create_and_download_invoice")
+def endpoint_create_download(ctx):
+    if not _wkhtmltopdf_available():
+        raise Skip("wkhtmltopdf not installed")
+    record = synthetic_invoice_records(1, 10, seed=4)[0]
+    _expect(ctx.post_json("/api/invoices/create-download/", record))
+    return lambda: _expect(ctx.post_json("/api/invoices/create-download/", record))
+
+
+@case("endpoint.import_100")
+def endpoint_import(ctx):
+    records = synthetic_invoice_records(100, 5, seed=5)
+    return lambda: _expect(ctx.post_json("/api/invoices/import/", {"invoices": records}), 201)
+
+
+@case("endpoint.list_page")
+def endpoint_list(ctx):
+    return lambda: _expect(ctx.client.get("/api/invoices/?page_size=50"))
+
+
+@case("endpoint.search")
+def endpoint_search(ctx):
+    return lambda: _expect(ctx.client.get("/api/invoices/search/?q=line"))
+
+
+@case("endpoint.invoice_pdf_cold")
+def endpoint_pdf_cold(ctx):
+    from . import pdf_cache
+
+    invoice_no = ctx.invoice_nos[1]
+    url = f"/api/invoices/{invoice_no}/pdf/"
+
+    def run():
+        pdf_cache.get_cache().clear()
+        return _expect(ctx.client.get(url))
+    return run
+
+
+@case("endpoint.invoice_pdf_not_modified")
+def endpoint_pdf_304(ctx):
+    url = f"/api/invoices/{ctx.invoice_nos[2]}/pdf/"
+    etag = _expect(ctx.client.get(url))["ETag"]
+    return lambda: _expect(ctx.client.get(url, HTTP_IF_NONE_MATCH=etag), 304)
+
+
+@case("endpoint.export_csv")
+def endpoint_export(ctx):
+    return lambda: _expect(ctx.client.get("/api/invoices/export/?format=csv"))
+
+
+# -----------------------------
+# Runner and baselines
+# -----------------------------
+def run_cases(names=None, repeat=5, log=None):
+    """{name: {"seconds": best, "queries": n} or {"skipped": reason}} for the selected cases."""
+    ctx = Context()
+    results = {}
+    for name, setup in CASES.items():
+        if names and name not in names:
+            continue
+        try:
+            fn = setup(ctx)
+        except Skip as e:
+            results[name] = {"skipped": str(e)}
+            continue
+
+        best = None
+        for _ in range(repeat):
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                fn()
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {"seconds": best, "queries": len(queries)}
+        if log:
+            log(name, results[name])
+    return results
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, threshold):
+    """Human-readable regressions against `baseline` ({"results": {...}})."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before or "skipped" in result or "skipped" in before:
+            continue
+        slower = result["seconds"] - before["seconds"]
+        if slower > MIN_DELTA_SECONDS and result["seconds"] > before["seconds"] * (1 + threshold):
+            regressions.append(
+                f"{name}: {result['seconds'] * 1000:.1f} ms vs {before['seconds'] * 1000:.1f} ms baseline "
+                f"(+{slower / before['seconds']:.0%})"
+            )
+        if result["queries"] > before["queries"]:
+            regressions.append(f"{name}: {result['queries']} queries vs {before['queries']} baseline")
+    return regressions
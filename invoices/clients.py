@@ -0,0 +1,73 @@
+# invoices/clients.py
+# Lazily built, per-process clients for external services.
+#
+# boto3 takes a few hundred milliseconds to import and a client another
+# hundred to build, so nothing here runs at import time: the first request
+# that needs Textract pays for it once per worker process. A forked child
+# builds its own client (boto3 clients must not be shared across a fork).
+import os
+import threading
+
+from django.conf import settings
+
+from . import offload, pages
+
+
+TEXTRACT_DEFAULTS = {
+    # Enough connections for every thread that may call Textract at once
+    "MAX_POOL_CONNECTIONS": None,  # None: batch workers + async offload threads + page workers + 10
+    "CONNECT_TIMEOUT": 5,
+    "READ_TIMEOUT": 60,
+    "MAX_ATTEMPTS": 5,
+    "RETRY_MODE": "adaptive",  # client-side rate limiting on throttling errors
+}
+
+_textract_client = None
+_textract_pid = None
+_lock = threading.Lock()
+
+
+def textract_options():
+    return {**TEXTRACT_DEFAULTS, **getattr(settings, "TEXTRACT_CLIENT", {})}
+
+
+def build_textract_client():
+    import boto3
+    from botocore.config import Config
+
+    options = textract_options()
+    pool = options["MAX_POOL_CONNECTIONS"] or (
+        getattr(settings, "TEXTRACT_BATCH_WORKERS", 8) + offload.worker_count() + pages.worker_count() + 10
+    )
+    config = Config(
+        max_pool_connections=pool,
+        connect_timeout=options["CONNECT_TIMEOUT"],
+        read_timeout=options["READ_TIMEOUT"],
+        retries={"max_attempts": options["MAX_ATTEMPTS"], "mode": options["RETRY_MODE"]},
+        tcp_keepalive=True,
+    )
+    return boto3.client(
+        "textract",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_REGION"),
+        config=config,
+    )
+
+
+def get_textract_client():
+    global _textract_client, _textract_pid
+    if _textract_client is None or _textract_pid != os.getpid():
+        with _lock:
+            if _textract_client is None or _textract_pid != os.getpid():
+                _textract_client = build_textract_client()
+                _textract_pid = os.getpid()
+    return _textract_client
+
+
+def set_textract_client(client):
+    """Use `client` (e.g. a botocore Stubber'd client or a fake) instead; None goes back to the lazy default."""
+    global _textract_client, _textract_pid
+    with _lock:
+        _textract_client = client
+        _textract_pid = os.getpid() if client is not None else None
@@ -0,0 +1,108 @@
+# invoices/export.py
+# Streaming ledger export (CSV or JSON lines, optionally gzipped).
+#
+# Invoices and items are read with one LEFT JOIN query through .iterator(),
+# so rows are fetched from the database cursor in chunks and written out as
+# they arrive. Nothing holds the whole ledger in memory.
+import csv
+import io
+import json
+import zlib
+
+from .models import Invoice
+
+
+INVOICE_COLUMNS = [
+    "invoice_no", "invoice_date", "vat_date", "customer_name", "customer_address",
+    "contract_no", "po_no", "subtotal", "vat", "total",
+]
+ITEM_COLUMNS = ["description", "unit", "qty", "unit_rate"]
+CSV_HEADER = INVOICE_COLUMNS + ["item_" + column for column in ITEM_COLUMNS] + ["item_amount"]
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+CHUNK_SIZE = 2000        # rows per fetch from the database cursor
+FLUSH_BYTES = 64 * 1024  # size of the pieces handed to the response
+
+
+def ledger_rows(queryset=None, chunk_size=CHUNK_SIZE):
+    """One tuple per item (or per invoice without items): invoice columns, then item columns."""
+    queryset = Invoice.objects.all() if queryset is None else queryset
+    fields = ["id"] + INVOICE_COLUMNS + ["items__" + column for column in ITEM_COLUMNS]
+    return (
+        queryset.order_by("id", "items__id")
+        .values_list(*fields)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _item_amount(qty, unit_rate):
+    return None if qty is None else round(qty * unit_rate, 2)
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for row in rows:
+        writer.writerow(row[1:] + (_item_amount(row[-2], row[-1]),))
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _invoice_record(row):
+    record = dict(zip(INVOICE_COLUMNS, row[1:len(INVOICE_COLUMNS) + 1]))
+    record["invoice_date"] = record["invoice_date"].isoformat()
+    record["vat_date"] = record["vat_date"].isoformat()
+    record["items"] = []
+    return record
+
+
+def jsonl_chunks(rows):
+    """One JSON object per invoice with its items nested; relies on rows being ordered by invoice."""
+    pieces, size = [], 0
+    current_id, record = None, None
+    for row in rows:
+        if row[0] != current_id:
+            if record is not None:
+                line = json.dumps(record) + "\n"
+                pieces.append(line)
+                size += len(line)
+                if size >= FLUSH_BYTES:
+                    yield "".join(pieces)
+                    pieces, size = [], 0
+            current_id, record = row[0], _invoice_record(row)
+        item = row[len(INVOICE_COLUMNS) + 1:]
+        if item[0] is not None:
+            record["items"].append(dict(zip(ITEM_COLUMNS, item), amount=_item_amount(item[2], item[3])))
+    if record is not None:
+        pieces.append(json.dumps(record) + "\n")
+    yield "".join(pieces)
+
+
+def encoded(chunks):
+    for chunk in chunks:
+        if chunk:
+            yield chunk.encode("utf-8")
+
+
+def gzipped(chunks, level=6):
+    # wbits=31: zlib writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(fmt="csv", queryset=None, gzip=False):
+    """Iterator of bytes for the whole export."""
+    chunks = csv_chunks if fmt == "csv" else jsonl_chunks
+    stream = encoded(chunks(ledger_rows(queryset)))
+    return gzipped(stream) if gzip else stream
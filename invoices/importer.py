@@ -0,0 +1,143 @@
+# invoices/importer.py
+# Bulk import of invoices with their line items.
+#
+# Records are validated in Python, invoice numbers are allocated in one go
+# (before the transaction, see reserve_invoice_numbers) and everything is
+# written with bulk_create inside a single transaction, so the
+# number of queries does not grow with the number of invoices. Allocated
+# numbers that clash with supplied or saved ones are re-drawn, and a record
+# whose number another request inserted first is reported, not a 500.
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .models import Invoice, Item, allocate_invoice_numbers
+from .serializers import InvoiceSerializer
+from .totals import compute_totals
+
+
+INVOICE_BATCH_SIZE = 500
+ITEM_BATCH_SIZE = 1000
+
+
+class InvoiceImportSerializer(InvoiceSerializer):
+    # Uniqueness is checked for the whole batch at once instead of per record
+    invoice_no = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+    class Meta(InvoiceSerializer.Meta):
+        fields = [f for f in InvoiceSerializer.Meta.fields if f != 'id']
+
+
+def import_invoices(records):
+    """
+    Validate and insert a list of invoice dicts (each with an "items" list).
+
+    Returns {"created": [invoice_no, ...], "errors": [{"index": i, "errors": ...}]}.
+    Invalid records are reported and skipped; the valid ones are written together.
+    """
+    errors = []
+    valid = []
+    for index, record in enumerate(records):
+        serializer = InvoiceImportSerializer(data=record)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({"index": index, "errors": serializer.errors})
+
+    # Supplied invoice numbers must be new, both to the database and within the batch
+    supplied = [data["invoice_no"] for _, data in valid if data.get("invoice_no")]
+    taken = set(Invoice.objects.filter(invoice_no__in=supplied).values_list("invoice_no", flat=True))
+    seen = set()
+    accepted = []
+    for index, data in valid:
+        invoice_no = data.get("invoice_no")
+        if invoice_no and (invoice_no in taken or invoice_no in seen):
+            errors.append(duplicate_error(index))
+            continue
+        if invoice_no:
+            seen.add(invoice_no)
+        accepted.append((index, data))
+
+    # Claimed before the transaction: a failed import leaves a gap, never a reused number
+    new_numbers = iter(draw_invoice_numbers(sum(1 for _, d in accepted if not d.get("invoice_no")), seen))
+    numbered = [(index, data, data.get("invoice_no") or next(new_numbers)) for index, data in accepted]
+
+    invoices = []
+    while numbered:
+        try:
+            invoices = write_invoices(numbered)
+            break
+        except IntegrityError:
+            # Another request inserted one of these numbers since they were checked
+            existing = set(
+                Invoice.objects.filter(invoice_no__in=[n for _, _, n in numbered])
+                .values_list("invoice_no", flat=True)
+            )
+            if not existing:
+                raise
+            numbered = renumber_conflicts(numbered, existing, errors)
+
+    errors.sort(key=lambda e: e["index"])
+    return {"created": [invoice.invoice_no for invoice in invoices], "errors": errors}
+
+
+def duplicate_error(index):
+    return {"index": index, "errors": {"invoice_no": ["Invoice number already exists."]}}
+
+
+def draw_invoice_numbers(count, reserved):
+    """`count` new invoice numbers, none in `reserved` or already used by an invoice."""
+    numbers = []
+    while len(numbers) < count:
+        drawn = allocate_invoice_numbers(count - len(numbers))
+        # Numbers can clash with ones supplied in the batch or saved by hand
+        clash = reserved | set(Invoice.objects.filter(invoice_no__in=drawn).values_list("invoice_no", flat=True))
+        numbers += [number for number in drawn if number not in clash]
+    return numbers
+
+
+def renumber_conflicts(numbered, existing, errors):
+    """Report records whose supplied number is now in `existing`; re-draw allocated ones."""
+    redraw = iter(draw_invoice_numbers(
+        sum(1 for _, data, n in numbered if n in existing and not data.get("invoice_no")),
+        {n for _, _, n in numbered},
+    ))
+    kept = []
+    for index, data, invoice_no in numbered:
+        if invoice_no in existing:
+            if data.get("invoice_no"):
+                errors.append(duplicate_error(index))
+                continue
+            invoice_no = next(redraw)
+        kept.append((index, data, invoice_no))
+    return kept
+
+
+def write_invoices(numbered):
+    """Insert (index, data, invoice_no) records and their items in one transaction."""
+    with transaction.atomic():
+        invoices = []
+        for _, data, invoice_no in numbered:
+            fields = {k: v for k, v in data.items() if k != "items"}
+            fields["invoice_no"] = invoice_no
+            fields["subtotal"], fields["vat"], fields["total"] = compute_totals(data["items"])
+            invoices.append(Invoice(**fields))
+        Invoice.objects.bulk_create(invoices, batch_size=INVOICE_BATCH_SIZE)
+
+        if any(invoice.pk is None for invoice in invoices):
+            # Backends that can't return ids from bulk inserts
+            ids = dict(
+                Invoice.objects.filter(invoice_no__in=[i.invoice_no for i in invoices])
+                .values_list("invoice_no", "id")
+            )
+            for invoice in invoices:
+                invoice.pk = ids[invoice.invoice_no]
+
+        Item.objects.bulk_create(
+            (
+                Item(invoice=invoice, **item)
+                for invoice, (_, data, _) in zip(invoices, numbered)
+                for item in data["items"]
+            ),
+            batch_size=ITEM_BATCH_SIZE,
+        )
+    return invoices
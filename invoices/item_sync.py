@@ -0,0 +1,103 @@
+# invoices/item_sync.py
+# Bringing an invoice's saved items in line with a submitted item list.
+#
+# A submitted item is matched to an existing row by its "id" when it has one,
+# otherwise to a row with identical values, and only what is left is paired
+# up by position (rows in primary key order). Only rows whose values differ
+# are updated, unmatched submitted items are created and leftover rows
+# deleted: editing one line of a 500-line invoice writes one row instead of
+# deleting and re-inserting all of them, and inserting or removing a line
+# does not rewrite every line after it.
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+
+from . import pdf_cache
+from .models import Item
+
+
+SYNC_FIELDS = ["description", "unit", "qty", "unit_rate"]
+UPDATE_BATCH_SIZE = 500
+
+ItemSync = namedtuple("ItemSync", ["items", "created", "updated", "deleted"])
+
+
+def clean_item(data):
+    """Submitted item dict -> {field: value} converted the way the model stores it."""
+    values = {}
+    for name in SYNC_FIELDS:
+        field = Item._meta.get_field(name)
+        value = data.get(name)
+        values[name] = field.to_python(field.get_default() if value in (None, "") else value)
+    return values
+
+
+def submitted_id(data):
+    try:
+        return int(data.get("id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def match_items(existing, items_data, incoming):
+    """Existing row (or None) for each submitted item: by id, then identical values, then position."""
+    matches = [None] * len(incoming)
+    unmatched = {item.pk: item for item in existing}
+
+    for index, data in enumerate(items_data):
+        item = unmatched.pop(submitted_id(data), None)
+        if item is not None:
+            matches[index] = item
+
+    by_values = defaultdict(list)
+    for item in unmatched.values():
+        by_values[tuple(getattr(item, name) for name in SYNC_FIELDS)].append(item)
+    for index, values in enumerate(incoming):
+        if matches[index] is None:
+            same = by_values.get(tuple(values[name] for name in SYNC_FIELDS))
+            if same:
+                matches[index] = item = same.pop(0)
+                del unmatched[item.pk]
+
+    leftover = iter(list(unmatched.values()))
+    for index in range(len(matches)):
+        if matches[index] is None:
+            matches[index] = next(leftover, None)
+    return matches
+
+
+def sync_items(invoice, items_data):
+    """
+    Update, create and delete items so `invoice` ends up with exactly `items_data`.
+
+    Runs in one transaction. Returns an ItemSync with the resulting items in
+    submitted order and the number of rows created, updated and deleted. Bulk
+    writes send no signals, so the invoice's cached PDF is dropped here once.
+    """
+    incoming = [clean_item(data) for data in items_data]
+    with transaction.atomic():
+        existing = list(Item.objects.filter(invoice=invoice).order_by("pk"))
+        matches = match_items(existing, items_data, incoming)
+
+        changed, new = [], []
+        for index, (item, values) in enumerate(zip(matches, incoming)):
+            if item is None:
+                matches[index] = item = Item(invoice=invoice, **values)
+                new.append(item)
+            elif any(getattr(item, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(item, name, value)
+                changed.append(item)
+        if changed:
+            Item.objects.bulk_update(changed, SYNC_FIELDS, batch_size=UPDATE_BATCH_SIZE)
+        created = Item.objects.bulk_create(new)
+
+        kept = {item.pk for item in matches if item.pk is not None}
+        removed = [item.pk for item in existing if item.pk not in kept]
+        if removed:
+            Item.objects.filter(pk__in=removed).delete()
+
+    if changed or created or removed:
+        pdf_cache.invalidate(invoice.pk)
+
+    return ItemSync(matches, len(created), len(changed), len(removed))
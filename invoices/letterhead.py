@@ -0,0 +1,33 @@
+# invoices/letterhead.py
+# The company letterhead drawn behind ReportLab invoices.
+#
+# Wrapping the JPEG in an ImageReader for every PDF decodes the whole image
+# (ReportLab fingerprints the RGB data) just to embed the original JPEG stream
+# again. Handing drawImage() the file path instead makes ReportLab copy the
+# JPEG stream into the document as-is, keyed by the path, so nothing is
+# decoded and the image is embedded at most once per document. The file is
+# still read and ASCII85-encoded for every PDF, which is slow without
+# ReportLab's rl_accel extension (requirements.txt).
+import os
+
+from django.conf import settings
+
+
+LETTERHEAD_PATH = os.path.join(settings.BASE_DIR, "invoices", "static", "invoices", "ISMADTECHNICAL_TEMPLATE.jpg")
+
+
+def letterhead_version(path=LETTERHEAD_PATH):
+    """File name and mtime of the letterhead, for the PDF cache's template version; None if it is missing."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return f"{os.path.basename(path)}:{mtime}"
+
+
+def draw_letterhead(c, width, height, path=LETTERHEAD_PATH):
+    """Draw the letterhead over the whole page of canvas `c`; False if the file is missing."""
+    if not os.path.exists(path):
+        return False
+    c.drawImage(path, 0, 0, width, height, preserveAspectRatio=True, anchor="c")
+    return True
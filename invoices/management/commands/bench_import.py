@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from invoices.bench import scratch_database, synthetic_invoice_records
+from invoices.importer import import_invoices
+
+
+class Command(BaseCommand):
+    help = "Show that bulk import keeps the number of queries per invoice constant."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+        parser.add_argument("--items", type=int, default=5, help="Line items per invoice.")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.stdout.write(f"{'invoices':>9} {'queries':>8} {'q/invoice':>10} {'ms':>9} {'invoices/s':>11}")
+            for size in options["sizes"]:
+                records = synthetic_invoice_records(size, options["items"], seed=size)
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    result = import_invoices(records)
+                    elapsed = time.perf_counter() - start
+                assert len(result["created"]) == size, result["errors"][:3]
+                self.stdout.write(
+                    f"{size:>9} {len(queries):>8} {len(queries) / size:>10.3f} "
+                    f"{elapsed * 1000:>9.1f} {size / elapsed:>11.0f}"
+                )
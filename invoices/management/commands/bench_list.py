@@ -0,0 +1,83 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from invoices.bench import scratch_database
+from invoices.models import Invoice, Item
+from invoices.pagination import InvoiceKeysetPagination, encode_cursor
+
+
+def seed(start, stop, items_per_invoice, rng):
+    first_day = date(2020, 1, 1)
+    for lo in range(start, stop, 5000):
+        invoices = Invoice.objects.bulk_create(
+            Invoice(
+                invoice_no=f"LIST-{i}",
+                invoice_date=first_day + timedelta(days=rng.randint(0, 5 * 365)),
+                customer_name=f"Customer {rng.randint(1, 500)}",
+                total=round(rng.uniform(10, 10_000), 2),
+            )
+            for i in range(lo, min(lo + 5000, stop))
+        )
+        Item.objects.bulk_create(
+            Item(invoice=invoice, description=f"Line {n}", qty=1, unit_rate=invoice.total)
+            for invoice in invoices
+            for n in range(items_per_invoice)
+        )
+
+
+class Command(BaseCommand):
+    help = "Time the first and a deep page of the invoice list (keyset) against OFFSET paging as the table grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--items", type=int, default=2, help="Line items per invoice.")
+        parser.add_argument("--page-size", type=int, default=50)
+
+    def time_get(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.content[:200]
+        return elapsed * 1000, len(queries)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        page_size = options["page_size"]
+        client = Client()
+        ordering = InvoiceKeysetPagination.ordering
+
+        with scratch_database(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            self.stdout.write(
+                f"{'invoices':>9} {'first ms':>9} {'deep ms':>8} {'queries':>8} {'offset ms':>10}  filtered ms"
+            )
+            seeded = 0
+            for size in options["sizes"]:
+                seed(seeded, size, options["items"], rng)
+                seeded = size
+                connection.queries_log.clear()
+
+                deep_offset = size - 2 * page_size
+                anchor = Invoice.objects.order_by(*ordering)[deep_offset - 1]
+
+                first_ms, _ = self.time_get(client, f"/api/invoices/?page_size={page_size}")
+                deep_ms, queries = self.time_get(
+                    client, f"/api/invoices/?page_size={page_size}&cursor={encode_cursor(anchor)}"
+                )
+                filtered_ms, _ = self.time_get(
+                    client, f"/api/invoices/?page_size={page_size}&customer=Customer%207&date_from=2022-01-01"
+                )
+
+                start = time.perf_counter()
+                list(Invoice.objects.order_by(*ordering)[deep_offset:deep_offset + page_size])
+                offset_ms = (time.perf_counter() - start) * 1000
+
+                self.stdout.write(
+                    f"{size:>9} {first_ms:>9.1f} {deep_ms:>8.1f} {queries:>8} {offset_ms:>10.1f}  {filtered_ms:>11.1f}"
+                )
@@ -0,0 +1,76 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.bench import synthetic_invoice_photo, timed
+from invoices import preprocess
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how much the pre-Textract image normalization shrinks uploads, what it costs "
+        "and the net effect on request latency at a given upload bandwidth to AWS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", nargs="*", default=[], help="Image files to measure (default: samples).")
+        parser.add_argument("--samples", type=int, default=3, help="Synthetic phone photos when no --images are given.")
+        parser.add_argument("--uplink-mbps", type=float, default=20.0, help="Upload bandwidth to Textract.")
+        parser.add_argument("--dpi", type=int, help="Override TEXTRACT_PREPROCESS TARGET_DPI.")
+        parser.add_argument("--quality", type=int, help="Override TEXTRACT_PREPROCESS QUALITY.")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        opts = preprocess.options()
+        if options["dpi"]:
+            opts["TARGET_DPI"] = options["dpi"]
+        if options["quality"]:
+            opts["QUALITY"] = options["quality"]
+
+        samples = []
+        for path in options["images"]:
+            try:
+                samples.append((Path(path).name, Path(path).read_bytes()))
+            except OSError as e:
+                raise CommandError(f"{path}: {e}")
+        if not samples:
+            samples = [
+                (f"photo-{i}.jpg", synthetic_invoice_photo(seed=i)) for i in range(options["samples"])
+            ]
+            template = Path(settings.MEDIA_ROOT) / "invoice_templates" / "ISMADTECHNICAL_TEMPLATE.jpg"
+            if template.exists():
+                samples.append((template.name, template.read_bytes()))
+
+        bytes_per_second = options["uplink_mbps"] * 1_000_000 / 8
+        self.stdout.write(
+            f"{opts['TARGET_DPI']} dpi, quality {opts['QUALITY']}, "
+            f"{'grayscale' if opts['GRAYSCALE'] else 'colour'}, uplink {options['uplink_mbps']:g} Mbit/s"
+        )
+        self.stdout.write(
+            f"{'image':<28} {'original KB':>12} {'sent KB':>9} {'saved':>7} "
+            f"{'prep ms':>8} {'upload ms saved':>16} {'net ms':>8}"
+        )
+        total_in = total_out = total_net = 0
+        for name, data in samples:
+            if len(data) < opts["MIN_BYTES"]:
+                # prepare() sends these as they are
+                seconds, normalized = 0.0, None
+            else:
+                seconds, normalized = timed(preprocess.normalize_image, data, opts, repeat=options["repeat"])
+            sent = len(normalized) if normalized is not None and len(normalized) < len(data) else len(data)
+            upload_saved = (len(data) - sent) / bytes_per_second
+            net = seconds - upload_saved
+            total_in += len(data)
+            total_out += sent
+            total_net += net
+            self.stdout.write(
+                f"{name[:28]:<28} {len(data) / 1024:>12.0f} {sent / 1024:>9.0f} "
+                f"{1 - sent / len(data):>7.0%} {seconds * 1000:>8.1f} "
+                f"{upload_saved * 1000:>16.1f} {net * 1000:>+8.1f}"
+            )
+        self.stdout.write(
+            f"total: {total_in / 1024:.0f} KB -> {total_out / 1024:.0f} KB "
+            f"({1 - total_out / total_in:.0%} saved), net latency {total_net * 1000 / len(samples):+.1f} ms per document "
+            "(negative is faster)"
+        )
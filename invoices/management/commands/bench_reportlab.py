@@ -0,0 +1,58 @@
+import time
+from datetime import date
+from io import BytesIO
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from invoices.letterhead import LETTERHEAD_PATH
+from invoices.utils import generate_letterhead_pdf
+
+
+def legacy_letterhead_pdf(invoice):
+    # save_invoice before letterhead.py: decode and fingerprint the JPEG per request
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    p.drawImage(ImageReader(LETTERHEAD_PATH), 0, 0, width=width, height=height, preserveAspectRatio=True, mask="auto")
+    p.setFont("Helvetica", 10)
+    p.drawString(400, 800, f"Invoice No: {invoice.invoice_no}")
+    p.drawString(400, 785, f"Invoice Date: {invoice.invoice_date}")
+    p.drawString(50, 750, f"Customer: {invoice.customer_name}")
+    p.drawString(50, 735, f"Address: {invoice.customer_address}")
+    p.drawString(400, 100, f"Subtotal: {invoice.subtotal:,.2f}")
+    p.drawString(400, 85, f"VAT (7.5%): {invoice.vat:,.2f}")
+    p.drawString(400, 70, f"Total: {invoice.total:,.2f}")
+    p.showPage()
+    p.save()
+    buffer.seek(0)
+    return buffer
+
+
+class Command(BaseCommand):
+    help = "Measure ReportLab letterhead invoices per second, decoding the JPEG per PDF (legacy) or not (letterhead.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        invoice = SimpleNamespace(
+            invoice_no="INV-20250101-0001",
+            invoice_date=date(2025, 1, 1),
+            customer_name="Bench Customer Ltd",
+            customer_address="1 Benchmark Way",
+            subtotal=1000.0,
+            vat=75.0,
+            total=1075.0,
+        )
+        n = options["requests"]
+        for label, fn in (("legacy", legacy_letterhead_pdf), ("current", generate_letterhead_pdf)):
+            fn(invoice)  # warm-up
+            start = time.perf_counter()
+            for _ in range(n):
+                size = len(fn(invoice).getvalue())
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{label:<8} {n / elapsed:8.1f} req/s   {elapsed * 1000 / n:6.2f} ms/pdf   {size:,} bytes")
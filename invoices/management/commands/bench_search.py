@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoices.bench import scratch_database, timed
+from invoices.models import Invoice, Item
+from invoices.search import icontains_invoice_ids, search_invoice_ids
+
+WORDS = (
+    "cable copper steel pipe valve pump bolt panel switch relay fuse conduit "
+    "gasket flange bearing motor filter hose clamp bracket welding paint labour "
+    "installation maintenance transport inspection calibration repair"
+).split()
+CITIES = ["Lagos", "Abuja", "Ibadan", "Kano", "Port Harcourt", "Enugu", "Benin", "Jos"]
+
+
+def seed(items, items_per_invoice, rng):
+    for lo in range(0, items // items_per_invoice, 5000):
+        invoices = Invoice.objects.bulk_create(
+            Invoice(
+                invoice_no=f"SEARCH-{i}",
+                customer_name=f"Customer {rng.randint(1, 5000)}",
+                customer_address=f"{rng.randint(1, 200)} Market Road, {rng.choice(CITIES)}",
+            )
+            for i in range(lo, min(lo + 5000, items // items_per_invoice))
+        )
+        Item.objects.bulk_create(
+            Item(invoice=invoice, description=" ".join(rng.sample(WORDS, 3)) + f" lot{rng.randint(1, 100000)}")
+            for invoice in invoices
+            for _ in range(items_per_invoice)
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare FTS5 search with icontains scans over a large synthetic item table. "
+        "icontains returns the newest 50 unranked matches, so it can stop early on very common words; "
+        "FTS ranks every match but never scans the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=1_000_000)
+        parser.add_argument("--items-per-invoice", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        queries = ["cable", "copper valve", "calib", "lot4242", "Ibadan", "nosuchword"]
+        with scratch_database():
+            start = time.perf_counter()
+            seed(options["items"], options["items_per_invoice"], random.Random(0))
+            self.stdout.write(f"Seeded {options['items']} items in {time.perf_counter() - start:.1f}s (index kept by triggers)")
+
+            self.stdout.write(f"{'query':<14} {'fts ms':>8} {'icontains ms':>13} {'speedup':>8} {'hits':>5}")
+            for query in queries:
+                fts_s, fts_hits = timed(search_invoice_ids, query, 50, repeat=options["repeat"])
+                like_s, _ = timed(icontains_invoice_ids, query, 50, repeat=options["repeat"])
+                self.stdout.write(
+                    f"{query:<14} {fts_s * 1000:>8.1f} {like_s * 1000:>13.1f} {like_s / fts_s:>7.2f}x {len(fts_hits):>5}"
+                )
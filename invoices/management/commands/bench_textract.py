@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from invoices.bench import synthetic_textract_response, timed
+from invoices.textract import parse_response
+
+
+def legacy_parse(response):
+    # The pre-index implementation: one linear scan of Blocks per relationship id
+    blocks = response["Blocks"]
+    rows = []
+    for block in blocks:
+        if block.get("BlockType") == "KEY_VALUE_SET" and "KEY" in block.get("EntityTypes", []):
+            for rel in block.get("Relationships", []) or []:
+                for rid in rel.get("Ids", []):
+                    next((bb for bb in blocks if bb["Id"] == rid), None)
+        if block.get("BlockType") == "TABLE":
+            for rel in block.get("Relationships", []) or []:
+                for cid in rel.get("Ids", []):
+                    cell = next((b for b in blocks if b.get("Id") == cid), None)
+                    for r in cell.get("Relationships", []) or []:
+                        for wid in r.get("Ids", []):
+                            word = next((b for b in blocks if b.get("Id") == wid), None)
+                            rows.append(word.get("Text", ""))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Time the Textract response parser on synthetic responses of increasing size."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument(
+            "--legacy-max", type=int, default=10_000,
+            help="Also time the old quadratic parser for sizes up to this many blocks (0 disables).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'blocks':>10} {'parser ms':>12} {'us/block':>10} {'legacy ms':>12}")
+        for size in options["sizes"]:
+            response = synthetic_textract_response(size)
+            n_blocks = len(response["Blocks"])
+            seconds, _ = timed(parse_response, response, repeat=options["repeat"])
+
+            legacy = "-"
+            if size <= options["legacy_max"]:
+                legacy_seconds, _ = timed(legacy_parse, response, repeat=1)
+                legacy = f"{legacy_seconds * 1000:.1f}"
+
+            self.stdout.write(
+                f"{n_blocks:>10} {seconds * 1000:>12.2f} {seconds * 1e6 / n_blocks:>10.2f} {legacy:>12}"
+            )
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from invoices.bench import timed
+from invoices.uploads import store_upload
+
+
+def make_upload(size):
+    # Django spools anything over FILE_UPLOAD_MAX_MEMORY_SIZE to a temporary file
+    upload = TemporaryUploadedFile("scan.pdf", "application/pdf", size, None)
+    block = b"%PDF-1.7\n" + os.urandom(1024 * 1024 - 9)
+    written = 0
+    while written < size:
+        chunk = block[: size - written]
+        upload.write(chunk)
+        written += len(chunk)
+    upload.seek(0)
+    return upload
+
+
+def legacy_store(upload):
+    # The previous extract_invoice path: buffer, save, reopen, read again
+    upload.seek(0)
+    path = default_storage.save("invoice_templates/legacy.pdf", ContentFile(upload.read()))
+    data = default_storage.open(path).read()
+    hashlib.sha256(data).hexdigest()  # the Textract cache key
+    return data
+
+
+def streaming_store(upload):
+    upload.seek(0)
+    return store_upload(upload, max_bytes=upload.size).data
+
+
+def peak_memory(fn, upload):
+    tracemalloc.start()
+    try:
+        fn(upload)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = "Compare the legacy and single-pass upload paths on large PDF uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        size = options["size_mb"] * 1024 * 1024
+        media_root = tempfile.mkdtemp(prefix="bench-upload-")
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                upload = make_upload(size)
+                self.stdout.write(f"{options['size_mb']} MB upload")
+                for label, fn in (("legacy", legacy_store), ("streaming", streaming_store)):
+                    seconds, _ = timed(fn, upload, repeat=options["repeat"])
+                    peak = peak_memory(fn, upload)
+                    self.stdout.write(
+                        f"  {label:<10} {seconds * 1000:8.1f} ms   peak {peak / size:5.2f}x upload "
+                        f"({peak / 1024 / 1024:.1f} MB)"
+                    )
+                upload.close()
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
@@ -0,0 +1,123 @@
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from invoices.api_views import invoice_template_context
+from invoices.models import Invoice
+from invoices.rendering import render_pdf
+from invoices.views import TEMPLATE_NAME, GenerateInvoicePdfView
+
+
+def pdf_text(pdf):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return ""
+    try:
+        return " ".join(page.extract_text() or "" for page in PdfReader(io.BytesIO(pdf)).pages)
+    except Exception:
+        return ""
+
+
+class Command(BaseCommand):
+    help = (
+        "Post distinct invoices to GenerateInvoicePdfView from many threads at once and check "
+        "every response is its own invoice's PDF. Uses its own invoice number prefix in the "
+        "configured database and deletes those invoices afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=32)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--items", type=int, default=20, help="Line items per invoice.")
+        parser.add_argument("--prefix", default="PDFCHECK")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        Invoice.objects.filter(invoice_no__startswith=f"{prefix}-").delete()
+        payloads = [
+            {
+                "invoice_no": f"{prefix}-{i}",
+                "customer_name": f"Concurrency Customer {i}",
+                "items": [
+                    {"description": f"Invoice {i} line {n}", "unit": "pcs", "qty": n + 1, "unit_rate": i + n / 100}
+                    for n in range(options["items"])
+                ],
+            }
+            for i in range(options["requests"])
+        ]
+
+        view = GenerateInvoicePdfView.as_view()
+        factory = RequestFactory()
+        go = threading.Event()
+
+        def post(payload):
+            try:
+                go.wait()  # every thread starts together
+                request = factory.post("/", json.dumps(payload), content_type="application/json")
+                return view(request)
+            finally:
+                close_old_connections()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["threads"]) as executor:
+                futures = [executor.submit(post, payload) for payload in payloads]
+                go.set()
+                responses = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+            problems = self.verify(payloads, responses)
+        finally:
+            Invoice.objects.filter(invoice_no__startswith=f"{prefix}-").delete()
+
+        self.stdout.write(
+            f"{len(payloads)} requests on {options['threads']} threads in {elapsed:.2f}s, "
+            f"{len({r.content for r in responses})} distinct PDFs"
+        )
+        if problems:
+            raise CommandError("\n".join(problems[:10]))
+        self.stdout.write(self.style.SUCCESS("Every response was its own invoice's PDF."))
+
+    def verify(self, payloads, responses):
+        problems = []
+        for payload, response in zip(payloads, responses):
+            invoice_no = payload["invoice_no"]
+            if response.status_code != 200:
+                problems.append(f"{invoice_no}: HTTP {response.status_code} {response.content[:200]!r}")
+            elif f'filename="{invoice_no}.pdf"' not in response["Content-Disposition"]:
+                problems.append(f"{invoice_no}: answered as {response['Content-Disposition']}")
+            elif not response.content.startswith(b"%PDF"):
+                problems.append(f"{invoice_no}: body is not a PDF")
+        if problems:
+            return problems
+
+        bodies = [response.content for response in responses]
+        if len(set(bodies)) != len(bodies):
+            problems.append(f"only {len(set(bodies))} distinct PDFs for {len(bodies)} invoices")
+
+        # With a text layer, each PDF must name its invoice; otherwise it must match a serial render
+        if pdf_text(bodies[0]):
+            self.stdout.write("Checking invoice numbers in the PDF text.")
+            for payload, body in zip(payloads, bodies):
+                if payload["invoice_no"] not in pdf_text(body):
+                    problems.append(f"{payload['invoice_no']}: PDF text does not contain its invoice number")
+        else:
+            self.stdout.write("No PDF text layer; comparing with serial renders.")
+            invoices = Invoice.objects.filter(
+                invoice_no__in=[p["invoice_no"] for p in payloads]
+            ).prefetch_related("items")
+            by_no = {invoice.invoice_no: invoice for invoice in invoices}
+            for payload, body in zip(payloads, bodies):
+                invoice = by_no[payload["invoice_no"]]
+                items = sorted(invoice.items.all(), key=lambda item: item.pk)
+                html = render_to_string(TEMPLATE_NAME, invoice_template_context(invoice, items))
+                if render_pdf(html) != body:
+                    problems.append(f"{payload['invoice_no']}: PDF differs from a serial render of the invoice")
+        return problems
@@ -0,0 +1,41 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.export import FORMATS, export_stream
+from invoices.models import Invoice
+from invoices.serializers import InvoiceFilterSerializer
+
+
+class Command(BaseCommand):
+    help = "Stream all (or filtered) invoices with their items as CSV or JSON lines to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--output", "-o", help="File to write to (default: stdout).")
+        parser.add_argument("--date-from")
+        parser.add_argument("--date-to")
+        parser.add_argument("--customer")
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ("date_from", "date_to", "customer") if options[key]}
+        filters = InvoiceFilterSerializer(data=params)
+        if not filters.is_valid():
+            raise CommandError(filters.errors)
+
+        stream = export_stream(options["format"], filters.filter(Invoice.objects.all()), gzip=options["gzip"])
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        written = 0
+        start = time.perf_counter()
+        try:
+            for chunk in stream:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                out.close()
+            else:
+                out.flush()
+        self.stderr.write(f"Wrote {written} bytes in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from invoices.models import TemplateBlob
+from invoices.template_store import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored invoice scans that no invoice, extraction job or cached Textract "
+        "response refers to, and report the bytes reclaimed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age-hours", type=float, default=24,
+            help="Keep scans used more recently than this (extractions not saved yet).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be deleted.")
+        parser.add_argument(
+            "--include-untracked", action="store_true",
+            help="Also consider files in invoice_templates/ saved before deduplication.",
+        )
+        parser.add_argument("--list", action="store_true", help="Print every deleted path.")
+
+    def handle(self, *args, **options):
+        report = collect_garbage(
+            min_age=timedelta(hours=options["min_age_hours"]),
+            dry_run=options["dry_run"],
+            include_untracked=options["include_untracked"],
+        )
+        if options["list"]:
+            for path in report.removed_paths:
+                self.stdout.write(path)
+
+        stored = TemplateBlob.objects.aggregate(blobs=Count("pk"), size=Sum("size"))
+        verb = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(
+            f"{verb} {report.removed} of {report.scanned} scans, "
+            f"{report.bytes_reclaimed:,} bytes reclaimed; {report.kept} kept. "
+            f"{stored['blobs']} stored scans, {stored['size'] or 0:,} bytes."
+        )
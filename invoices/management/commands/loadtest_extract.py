@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from invoices.bench import synthetic_textract_response
+from invoices.clients import set_textract_client
+
+BOUNDARY = "loadtestboundary"
+
+
+class DelayedTextract:
+    """Stands in for the boto3 client: sleeps like a slow AnalyzeDocument call, then answers."""
+
+    def __init__(self, delay, blocks=500):
+        self.delay = delay
+        self.response = synthetic_textract_response(blocks, seed=19)
+
+    def analyze_document(self, **kwargs):
+        time.sleep(self.delay)
+        return dict(self.response)
+
+
+def multipart_body():
+    # Random bytes each time so the Textract cache never answers for us
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="scan.jpg"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + os.urandom(4096) + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def post(application, path):
+    body = multipart_body()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "server": ("testserver", 80), "client": ("127.0.0.1", 50000),
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = None
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()  # no disconnect until the response is sent
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await application(scope, receive, send)
+    return status
+
+
+async def run(application, path, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await post(application, path)
+
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - start, statuses
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the extract endpoints through the ASGI application with a fake Textract that takes "
+        "--delay seconds per call. Compares a sync worker (one request at a time, as under WSGI), "
+        "the sync view under ASGI and the async view."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=200)
+        parser.add_argument("--delay", type=float, default=0.5, help="Seconds per fake AnalyzeDocument call.")
+        parser.add_argument("--blocks", type=int, default=500, help="Blocks in the fake Textract response.")
+        parser.add_argument("--sync-worker-requests", type=int, default=10,
+                            help="Requests for the one-at-a-time sync worker run.")
+
+    def handle(self, *args, **options):
+        set_textract_client(DelayedTextract(options["delay"], options["blocks"]))
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            MEDIA_ROOT=tmp,
+            TEXTRACT_CACHE={"PATH": os.path.join(tmp, "textract_cache.sqlite3")},
+        ):
+            application = get_asgi_application()
+            self.stdout.write(
+                f"{'mode':<18} {'endpoint':<30} {'requests':>8} {'in flight':>9} {'seconds':>8} {'req/s':>8} {'errors':>7}"
+            )
+            for label, path, requests, concurrency in (
+                ("sync worker", "/api/invoices/extract/", options["sync_worker_requests"], 1),
+                ("sync view, ASGI", "/api/invoices/extract/", options["requests"], options["concurrency"]),
+                ("async view, ASGI", "/api/invoices/async/extract/", options["requests"], options["concurrency"]),
+            ):
+                elapsed, statuses = asyncio.run(run(application, path, requests, concurrency))
+                errors = sum(1 for status in statuses if status != 200)
+                self.stdout.write(
+                    f"{label:<18} {path:<30} {requests:>8} {concurrency:>9} {elapsed:>8.2f} "
+                    f"{requests / elapsed:>8.1f} {errors:>7}"
+                )
+        set_textract_client(None)
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the invoice and item tables."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if not rebuild_index():
+            raise CommandError("Full-text search tables only exist on SQLite; nothing to rebuild.")
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt in {time.perf_counter() - start:.2f}s."))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoices.models import Invoice
+from invoices.totals import recompute_all
+
+
+class Command(BaseCommand):
+    help = "Recompute subtotal, VAT and total for all invoices (or a pk range) with set-based UPDATEs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50_000, help="Invoices per UPDATE range.")
+        parser.add_argument("--from-id", type=int)
+        parser.add_argument("--to-id", type=int)
+
+    def handle(self, *args, **options):
+        queryset = Invoice.objects.all()
+        if options["from_id"] is not None:
+            queryset = queryset.filter(pk__gte=options["from_id"])
+        if options["to_id"] is not None:
+            queryset = queryset.filter(pk__lte=options["to_id"])
+
+        start = time.perf_counter()
+        updated = recompute_all(queryset, batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Recomputed totals for {updated} invoices in {elapsed:.2f}s."))
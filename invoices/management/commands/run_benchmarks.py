@@ -0,0 +1,82 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from invoices import archive
+from invoices.bench import scratch_database
+from invoices.benchmarks import CASES, compare, load_baseline, run_cases, save_baseline
+
+BENCH_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bench-default"},
+    "invoice_pdfs": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bench-pdfs"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the benchmark suite against a scratch database and compare it with the JSON baseline. "
+        "Fails if a case got slower than --threshold or makes more queries than the baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--baseline", default=getattr(settings, "BENCHMARK_BASELINE", None))
+        parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+        parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--list", action="store_true", help="List the cases and exit.")
+        parser.add_argument("cases", nargs="*", help="Only run these cases.")
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for name in CASES:
+                self.stdout.write(name)
+            return
+        unknown = set(options["cases"]) - set(CASES)
+        if unknown:
+            raise CommandError(f"Unknown cases: {', '.join(sorted(unknown))}")
+        if not options["baseline"]:
+            raise CommandError("No baseline path: pass --baseline or set BENCHMARK_BASELINE.")
+        path = Path(options["baseline"])
+        baseline = load_baseline(path)
+        previous = baseline["results"] if baseline else {}
+
+        self.stdout.write(f"{'case':<40} {'ms':>9} {'queries':>8} {'baseline ms':>12} {'change':>8}")
+
+        def log(name, result):
+            before = previous.get(name, {})
+            if "seconds" in before:
+                change = f"{result['seconds'] / before['seconds'] - 1:+.0%}"
+                base = f"{before['seconds'] * 1000:.2f}"
+            else:
+                change, base = "new", "-"
+            self.stdout.write(
+                f"{name:<40} {result['seconds'] * 1000:>9.2f} {result['queries']:>8} {base:>12} {change:>8}"
+            )
+
+        try:
+            with scratch_database(), override_settings(ALLOWED_HOSTS=["testserver"], CACHES=BENCH_CACHES):
+                results = run_cases(options["cases"] or None, repeat=options["repeat"], log=log)
+        finally:
+            archive.reset_executor()
+
+        for name, result in results.items():
+            if "skipped" in result:
+                self.stdout.write(f"{name:<40} skipped: {result['skipped']}")
+
+        if options["save_baseline"]:
+            if baseline and options["cases"]:
+                # Partial run: keep the other cases' numbers
+                results = {**previous, **results}
+            save_baseline(path, results)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {path}"))
+            return
+        if baseline is None:
+            self.stdout.write(f"No baseline at {path}; run with --save-baseline to create one.")
+            return
+
+        regressions = compare(results, baseline, options["threshold"])
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,63 @@
+import multiprocessing
+import time
+from collections import Counter
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+def _worker(prefix, allocations, block_size, bulk_every):
+    # Runs in a fresh (spawned) interpreter, after django.setup()
+    from django.test import override_settings
+    from invoices.models import allocate_invoice_numbers, generate_invoice_no
+
+    numbers = []
+    with override_settings(INVOICE_NO_BLOCK_SIZE=block_size):
+        for i in range(allocations):
+            if bulk_every and i % bulk_every == 0:
+                numbers.extend(allocate_invoice_numbers(3, prefix=prefix))
+            else:
+                numbers.append(generate_invoice_no(prefix=prefix))
+    connection.close()
+    return numbers
+
+
+class Command(BaseCommand):
+    help = (
+        "Allocate invoice numbers from many processes at once and check they are all unique. "
+        "Uses its own prefix in the configured database and removes its sequence rows afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--allocations", type=int, default=500, help="Allocations per process.")
+        parser.add_argument("--block-size", type=int, default=10)
+        parser.add_argument("--bulk-every", type=int, default=50, help="Every Nth allocation reserves 3 at once (0: never).")
+        parser.add_argument("--prefix", default="STRESS")
+
+    def handle(self, *args, **options):
+        from invoices.models import InvoiceSequence
+
+        prefix = options["prefix"]
+        InvoiceSequence.objects.filter(prefix=prefix).delete()
+        connection.close()
+
+        args = (prefix, options["allocations"], options["block_size"], options["bulk_every"])
+        start = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(options["processes"], initializer=django.setup) as pool:
+            results = pool.starmap(_worker, [args] * options["processes"])
+        elapsed = time.perf_counter() - start
+
+        numbers = [n for result in results for n in result]
+        duplicates = [n for n, c in Counter(numbers).items() if c > 1]
+        sequence_rows = list(InvoiceSequence.objects.filter(prefix=prefix).values_list("day", "last_value"))
+        InvoiceSequence.objects.filter(prefix=prefix).delete()
+
+        self.stdout.write(
+            f"{len(numbers)} numbers from {options['processes']} processes in {elapsed:.2f}s "
+            f"({len(numbers) / elapsed:.0f}/s), sequence rows {sequence_rows}"
+        )
+        if duplicates:
+            raise CommandError(f"{len(duplicates)} duplicate invoice numbers, e.g. {duplicates[:5]}")
+        self.stdout.write(self.style.SUCCESS("All invoice numbers unique."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from invoices.textract_cache import get_cache
+
+
+class Command(BaseCommand):
+    help = "Show the size of the Textract result cache, or clear it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clear", action="store_true", help="Delete every cached analysis.")
+
+    def handle(self, *args, **options):
+        cache = get_cache()
+        if options["clear"]:
+            cache.clear()
+            self.stdout.write("Textract cache cleared.")
+
+        stats = cache.stats()
+        self.stdout.write(
+            f"{stats['disk_entries']} entries, {stats['disk_bytes']:,} of {stats['max_bytes']:,} bytes "
+            f"({cache.path})"
+        )
@@ -0,0 +1,152 @@
+# invoices/metrics.py
+# Request timing breakdowns (Server-Timing) and Prometheus histograms.
+#
+# `timing("name")` wraps a hot spot (Textract call, template render,
+# wkhtmltopdf, ReportLab build). While a request is being handled
+# (see middleware.ServerTimingMiddleware) the time is added to that request's
+# breakdown. It is always observed in the invoice_operation_seconds histogram.
+# Metrics are kept per process. Each worker exposes its own on /metrics.
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts (not cumulative) + the +Inf bucket, sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REQUEST_SECONDS = Histogram(
+    "invoice_http_request_seconds", "Time spent handling a request (view and middleware).",
+    ("view", "method", "status"),
+)
+OPERATION_SECONDS = Histogram(
+    "invoice_operation_seconds", "Time spent in instrumented operations.", ("operation",),
+)
+DB_SECONDS = Histogram(
+    "invoice_db_seconds_per_request", "Total database time per request.", ("view",),
+)
+DB_QUERIES = Histogram(
+    "invoice_db_queries_per_request", "Number of database queries per request.", ("view",), COUNT_BUCKETS,
+)
+REGISTRY = [REQUEST_SECONDS, OPERATION_SECONDS, DB_SECONDS, DB_QUERIES]
+
+
+def expose():
+    """All metrics in the Prometheus text exposition format."""
+    return "\n".join(metric.expose() for metric in REGISTRY) + "\n"
+
+
+# -----------------------------
+# Per-request breakdown
+# -----------------------------
+class RequestTimings:
+    def __init__(self):
+        self.durations = {}  # name -> [seconds, count], in first-seen order
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self.lock:
+            entry = self.durations.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total=None):
+        parts = []
+        for name, (seconds, count) in self.durations.items():
+            desc = f';desc="{count} queries"' if name == "db" else ""
+            parts.append(f"{name};dur={seconds * 1000:.1f}{desc}")
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar("invoice_request_timings", default=None)
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record(name, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def timing(name):
+    """Time a block (or, as a decorator, a function call) under `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record(name, elapsed)
+        OPERATION_SECONDS.observe(elapsed, operation=name)
+
+
+def db_timer(execute, sql, params, many, context):
+    """Execute wrapper adding every query to the current request's "db" timing."""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record("db", time.perf_counter() - start)
+
+
+def install_db_timer(sender, connection, **kwargs):
+    # connection_created receiver. Installed on every connection rather than
+    # around each request so ORM calls made from sync_to_async / executor
+    # threads are counted too; the contextvar decides which request they belong to.
+    if db_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_timer)
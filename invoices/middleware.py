@@ -0,0 +1,55 @@
+# invoices/middleware.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header (db, textract, template, wkhtmltopdf,
+    reportlab, total) to every response and records the request in the
+    /metrics histograms. Streaming responses are timed up to the point the
+    view returns, not until the body has been sent.
+
+    Works in both sync and async stacks, so async views stay on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def finish(self, request, response, timings, total):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        db_seconds, db_queries = timings.durations.get("db", (0.0, 0))
+        metrics.REQUEST_SECONDS.observe(total, view=view, method=request.method, status=response.status_code)
+        metrics.DB_SECONDS.observe(db_seconds, view=view)
+        metrics.DB_QUERIES.observe(db_queries, view=view)
+
+        response["Server-Timing"] = timings.server_timing(total)
+        return response
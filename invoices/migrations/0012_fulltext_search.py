@@ -0,0 +1,84 @@
+# Full-text search tables for SQLite (see invoices/search.py).
+# On other databases this migration does nothing and search falls back to icontains.
+
+from django.db import migrations
+
+
+CREATE_SQL = [
+    # External-content FTS5 tables: only the index is stored, text is read from the source rows
+    """CREATE VIRTUAL TABLE invoices_invoice_fts USING fts5(
+        customer_name, customer_address,
+        content='invoices_invoice', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE VIRTUAL TABLE invoices_item_fts USING fts5(
+        description,
+        content='invoices_item', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+
+    """CREATE TRIGGER invoices_invoice_fts_ai AFTER INSERT ON invoices_invoice BEGIN
+        INSERT INTO invoices_invoice_fts(rowid, customer_name, customer_address)
+        VALUES (new.id, new.customer_name, new.customer_address);
+    END""",
+    """CREATE TRIGGER invoices_invoice_fts_ad AFTER DELETE ON invoices_invoice BEGIN
+        INSERT INTO invoices_invoice_fts(invoices_invoice_fts, rowid, customer_name, customer_address)
+        VALUES ('delete', old.id, old.customer_name, old.customer_address);
+    END""",
+    # Only the indexed columns, so totals recomputes don't touch the index
+    """CREATE TRIGGER invoices_invoice_fts_au AFTER UPDATE OF customer_name, customer_address ON invoices_invoice BEGIN
+        INSERT INTO invoices_invoice_fts(invoices_invoice_fts, rowid, customer_name, customer_address)
+        VALUES ('delete', old.id, old.customer_name, old.customer_address);
+        INSERT INTO invoices_invoice_fts(rowid, customer_name, customer_address)
+        VALUES (new.id, new.customer_name, new.customer_address);
+    END""",
+
+    """CREATE TRIGGER invoices_item_fts_ai AFTER INSERT ON invoices_item BEGIN
+        INSERT INTO invoices_item_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER invoices_item_fts_ad AFTER DELETE ON invoices_item BEGIN
+        INSERT INTO invoices_item_fts(invoices_item_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER invoices_item_fts_au AFTER UPDATE OF description ON invoices_item BEGIN
+        INSERT INTO invoices_item_fts(invoices_item_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO invoices_item_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+
+    # Index whatever is already there
+    "INSERT INTO invoices_invoice_fts(invoices_invoice_fts) VALUES ('rebuild')",
+    "INSERT INTO invoices_item_fts(invoices_item_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS invoices_invoice_fts_ai",
+    "DROP TRIGGER IF EXISTS invoices_invoice_fts_ad",
+    "DROP TRIGGER IF EXISTS invoices_invoice_fts_au",
+    "DROP TRIGGER IF EXISTS invoices_item_fts_ai",
+    "DROP TRIGGER IF EXISTS invoices_item_fts_ad",
+    "DROP TRIGGER IF EXISTS invoices_item_fts_au",
+    "DROP TABLE IF EXISTS invoices_invoice_fts",
+    "DROP TABLE IF EXISTS invoices_item_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_invoice_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0013_template_blobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='templateblob',
+            name='ref_count',
+        ),
+    ]
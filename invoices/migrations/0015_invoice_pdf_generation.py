@@ -0,0 +1,78 @@
+# Invoice.pdf_generation and the SQLite triggers that bump it (see invoices/pdf_cache.py).
+# On other databases only the column is added; item_sync and the Item post_save
+# receiver still drop the PDF pointer there.
+#
+# SQLite adds the column by rebuilding invoices_invoice, which drops the
+# full-text search triggers from 0012, so they are created again afterwards
+# (and again when unapplying, since removing the column rebuilds the table too).
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+fulltext_search = import_module('invoices.migrations.0012_fulltext_search')
+SEARCH_TRIGGERS = [
+    statement for statement in fulltext_search.CREATE_SQL
+    if statement.startswith("CREATE TRIGGER invoices_invoice_fts_")
+]
+
+
+CREATE_SQL = [
+    """CREATE TRIGGER invoices_item_pdf_ai AFTER INSERT ON invoices_item BEGIN
+        UPDATE invoices_invoice SET pdf_generation = pdf_generation + 1 WHERE id = new.invoice_id;
+    END""",
+    """CREATE TRIGGER invoices_item_pdf_ad AFTER DELETE ON invoices_item BEGIN
+        UPDATE invoices_invoice SET pdf_generation = pdf_generation + 1 WHERE id = old.invoice_id;
+    END""",
+    """CREATE TRIGGER invoices_item_pdf_au AFTER UPDATE ON invoices_item BEGIN
+        UPDATE invoices_invoice SET pdf_generation = pdf_generation + 1 WHERE id IN (old.invoice_id, new.invoice_id);
+    END""",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS invoices_item_pdf_ai",
+    "DROP TRIGGER IF EXISTS invoices_item_pdf_ad",
+    "DROP TRIGGER IF EXISTS invoices_item_pdf_au",
+]
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in SEARCH_TRIGGERS:
+        name = statement.split()[2]
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0014_drop_template_blob_ref_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_generation',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
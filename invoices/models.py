@@ -1,7 +1,13 @@
 # invoices/models.py
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+import os
+import threading
+import uuid
 from datetime import date
-from django.db.models import Max
+from django.db.models import F, Max
+
+from .totals import aggregate_subtotal, compute_totals, totals_from_subtotal
 
 class Invoice(models.Model):
     invoice_no = models.CharField(max_length=50, unique=True)
@@ -18,11 +24,24 @@ class Invoice(models.Model):
 
     template_image = models.ImageField(upload_to='invoice_templates/', blank=True, null=True)
 
-    def calculate_totals(self):
-        items = self.items.all()
-        self.subtotal = sum(item.qty * item.unit_rate for item in items)
-        self.vat = round(self.subtotal * 0.075, 2)
-        self.total = round(self.subtotal + self.vat, 2)
+    # Bumped by database triggers whenever one of the invoice's items is
+    # inserted, updated or deleted, and by recompute_all() (see pdf_cache.py)
+    pdf_generation = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Newest-first listing and its keyset cursor (see pagination.py)
+            models.Index(fields=['-invoice_date', '-id'], name='invoice_date_id_idx'),
+            models.Index(fields=['customer_name', 'invoice_date'], name='invoice_customer_date_idx'),
+        ]
+
+    def calculate_totals(self, items=None):
+        # Pass the items just written to skip re-reading them; otherwise the
+        # subtotal is summed in the database
+        if items is not None:
+            self.subtotal, self.vat, self.total = compute_totals(items)
+        else:
+            self.subtotal, self.vat, self.total = totals_from_subtotal(aggregate_subtotal(self))
         self.save(update_fields=['subtotal', 'vat', 'total'])
 
     def __str__(self):
@@ -42,20 +61,157 @@ class Item(models.Model):
         return f"{self.description} ({self.qty} x {self.unit_rate})"
 
 
+class InvoiceSequence(models.Model):
+    """Last invoice number handed out for a prefix on a given day."""
+    prefix = models.CharField(max_length=20)
+    day = models.DateField()
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['prefix', 'day'], name='unique_invoice_sequence_per_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.prefix} {self.day}: {self.last_value}"
+
+
+# Numbers reserved by this process but not handed out yet: (prefix, day) -> [next, last]
+_reserved_numbers = {}
+_reserved_lock = threading.Lock()
+_reserved_pid = os.getpid()
+
+
+def _legacy_last_value(prefix, day):
+    # Seed a new day's sequence from invoices numbered before the sequence existed
+    base = f"{prefix}-{day.strftime('%Y%m%d')}-"
+    last = 0
+    for invoice_no in Invoice.objects.filter(invoice_no__startswith=base).values_list('invoice_no', flat=True):
+        try:
+            last = max(last, int(invoice_no[len(base):]))
+        except ValueError:
+            pass
+    return last
+
+
+def reserve_invoice_numbers(count, prefix="INV", day=None):
+    """
+    Atomically claim `count` consecutive sequence values for `prefix` on `day`.
+
+    Returns the first value claimed. The row update takes the database's
+    write lock, so concurrent workers can never be handed the same range.
+
+    Must not be called inside a transaction: the claim would only be committed
+    with the caller's, so a rollback would undo a range generate_invoice_no()
+    may already hold in its cache, and the row lock would be held, blocking
+    every other worker, until the caller finished.
+    """
+    if transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "Invoice numbers must be reserved outside a transaction."
+        )
+    day = day or date.today()
+    sequence = InvoiceSequence.objects.filter(prefix=prefix, day=day)
+    with transaction.atomic():
+        if not sequence.update(last_value=F('last_value') + count):
+            try:
+                with transaction.atomic():
+                    InvoiceSequence.objects.create(
+                        prefix=prefix, day=day, last_value=_legacy_last_value(prefix, day) + count,
+                    )
+            except IntegrityError:
+                # Another worker created today's row first
+                sequence.update(last_value=F('last_value') + count)
+        last = sequence.values_list('last_value', flat=True).get()
+    return last - count + 1
+
+
+def format_invoice_no(prefix, day, seq):
+    return f"{prefix}-{day.strftime('%Y%m%d')}-{seq:04d}"
+
+
 # Helper to generate reasonably unique invoice numbers
 def generate_invoice_no(prefix="INV"):
     # Format: INV-YYYYMMDD-XXXX (sequential per day)
+    global _reserved_pid
+    # Checked on every call, not just when a block is refilled, so callers
+    # inside a transaction fail the same way whatever the block size
+    if transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "Invoice numbers must be reserved outside a transaction."
+        )
     today = date.today()
-    day_prefix = today.strftime("%Y%m%d")
-    base = f"{prefix}-{day_prefix}-"
-    # Find the highest existing invoice with today's prefix
-    last = Invoice.objects.filter(invoice_no__startswith=base).order_by('invoice_no').last()
-    if not last:
-        seq = 1
-    else:
-        # extract trailing number
-        try:
-            seq = int(last.invoice_no.split('-')[-1]) + 1
-        except Exception:
-            seq = 1
-    return f"{base}{seq:04d}"
+    key = (prefix, today)
+    with _reserved_lock:
+        if _reserved_pid != os.getpid():
+            # Forked worker: the parent's reservations are not ours to use
+            _reserved_numbers.clear()
+            _reserved_pid = os.getpid()
+
+        block = _reserved_numbers.get(key)
+        if block is None or block[0] > block[1]:
+            block_size = getattr(settings, 'INVOICE_NO_BLOCK_SIZE', 1)
+            first = reserve_invoice_numbers(block_size, prefix=prefix, day=today)
+            block = _reserved_numbers[key] = [first, first + block_size - 1]
+            for stale in [k for k in _reserved_numbers if k[1] != today]:
+                del _reserved_numbers[stale]
+
+        seq = block[0]
+        block[0] += 1
+    return format_invoice_no(prefix, today, seq)
+
+
+def allocate_invoice_numbers(count, prefix="INV"):
+    """Return `count` consecutive invoice numbers for today with one reservation."""
+    if count <= 0:
+        return []
+    today = date.today()
+    first = reserve_invoice_numbers(count, prefix=prefix, day=today)
+    return [format_invoice_no(prefix, today, seq) for seq in range(first, first + count)]
+
+
+class ExtractionJob(models.Model):
+    """A batch of uploaded scans sent through Textract in the background."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Extraction job {self.id}"
+
+
+class ExtractionJobFile(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    job = models.ForeignKey(ExtractionJob, related_name='files', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    template_path = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class TemplateBlob(models.Model):
+    """One stored copy of an uploaded scan per distinct content (see template_store.py)."""
+    digest = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # No reference count is kept: collect_garbage() scans invoices, extraction
+    # jobs and the Textract cache for references instead
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
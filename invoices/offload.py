@@ -0,0 +1,42 @@
+# invoices/offload.py
+# Runs blocking work (boto3, wkhtmltopdf, ReportLab, file storage) for the
+# async views on a bounded thread pool.
+#
+# Django's sync_to_async defaults to a single shared thread, which would
+# serialize every Textract call again. This pool lets one ASGI worker keep
+# up to WORKERS blocking calls in flight; more than that queue.
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    "WORKERS": 200,
+}
+
+_executor = None
+_lock = threading.Lock()
+
+
+def worker_count():
+    return {**DEFAULTS, **getattr(settings, "ASYNC_OFFLOAD", {})}["WORKERS"]
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="invoice-offload")
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) run on the offload pool, with the caller's contextvars (request timings)."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, fn, *args, **kwargs))
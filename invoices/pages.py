@@ -0,0 +1,144 @@
+# invoices/pages.py
+# Page-parallel Textract extraction for multi-page uploads.
+#
+# Synchronous AnalyzeDocument takes one page at a time, so multi-page PDFs
+# (and multi-frame TIFFs) are split into single-page documents. The pages
+# are analyzed and parsed on a bounded, process-wide thread pool, then merged
+# back into one invoice_data payload with the page each item and field came
+# from. A 12-page upload takes about as long as its slowest page.
+import contextvars
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .textract import invoice_data_from_pages, parse_response
+from .textract_cache import analyze_document
+from .uploads import UploadTooLarge
+
+
+DEFAULTS = {
+    "WORKERS": 8,      # Textract calls in flight across all uploads in this process
+    "MAX_PAGES": 50,
+}
+
+_executor = None
+_lock = threading.Lock()
+
+
+class TooManyPages(UploadTooLarge):
+    pass
+
+
+def options():
+    return {**DEFAULTS, **getattr(settings, "TEXTRACT_PAGES", {})}
+
+
+def worker_count():
+    return options()["WORKERS"]
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="textract-page")
+    return _executor
+
+
+def split_pdf(data):
+    """Single-page PDFs for each page of `data`, or None without pypdf or for unreadable PDFs."""
+    try:
+        from pypdf import PdfReader, PdfWriter
+        from pypdf.errors import PdfReadError
+    except ImportError:
+        return None
+
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        if len(reader.pages) < 2:
+            return None
+        check_page_count(len(reader.pages))
+        pages = []
+        for page in reader.pages:
+            writer = PdfWriter()
+            writer.add_page(page)
+            out = io.BytesIO()
+            writer.write(out)
+            pages.append(out.getvalue())
+        return pages
+    except PdfReadError:
+        return None
+
+
+def split_tiff(data):
+    """One PNG per frame of a multi-frame TIFF, or None for anything else."""
+    from PIL import Image, ImageSequence, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, OSError):
+        return None
+    if image.format != "TIFF" or getattr(image, "n_frames", 1) < 2:
+        return None
+    check_page_count(image.n_frames)
+    pages = []
+    for frame in ImageSequence.Iterator(image):
+        out = io.BytesIO()
+        frame.save(out, "PNG")
+        pages.append(out.getvalue())
+    return pages
+
+
+def check_page_count(count):
+    max_pages = options()["MAX_PAGES"]
+    if count > max_pages:
+        raise TooManyPages(f"Document has {count} pages; at most {max_pages} can be extracted")
+
+
+def split_pages(data):
+    """The upload as a list of single-page documents (just [data] when it has one page)."""
+    # Uploads arrive as a bytearray; only PDFs and TIFFs are read any further
+    magic = bytes(data[:4])
+    if magic == b"%PDF":
+        pages = split_pdf(data)
+    elif magic in (b"II*\x00", b"MM\x00*"):
+        pages = split_tiff(data)
+    else:
+        pages = None
+    return pages or [data]
+
+
+def analyze_page(client, data, digest=None):
+    """(fields, items) for one page; cached per page like any other document."""
+    return parse_response(analyze_document(client, data, digest=digest))
+
+
+def extract_document(client, data, digest=None):
+    """
+    invoice_data for an upload of any number of pages.
+
+    Single-page uploads are analyzed in the calling thread. Otherwise every page
+    goes to the page pool, each with the caller's contextvars (request timings),
+    and the results are merged in page order.
+    """
+    pages = split_pages(data)
+    if len(pages) == 1:
+        return invoice_data_from_pages([analyze_page(client, pages[0], digest)])
+
+    executor = get_executor()
+    futures = [
+        executor.submit(
+            contextvars.copy_context().run,
+            analyze_page, client, page, hashlib.sha256(page).hexdigest(),
+        )
+        for page in pages
+    ]
+    try:
+        return invoice_data_from_pages([future.result() for future in futures])
+    finally:
+        for future in futures:
+            future.cancel()
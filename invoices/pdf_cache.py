@@ -0,0 +1,106 @@
+# invoices/pdf_cache.py
+# Rendered invoice PDFs, cached by a hash of everything that goes into them.
+#
+# Two kinds of entries live in the "invoice_pdfs" cache:
+#   invoice-pdf:<invoice id>     -> (template version, pdf_generation, ETag of the current PDF)
+#   invoice-pdf-body:<etag>      -> the PDF bytes
+# A pointer is only used while both the template version and the invoice's
+# pdf_generation match what it was written with. Triggers on the item table
+# bump pdf_generation for every item insert, update and delete, however it
+# was made (admin, bulk or cascade deletes, queryset updates), and
+# recompute_all() bumps it in the same UPDATE that rewrites the totals, so
+# neither needs per-row cache work. Saving or deleting the invoice itself
+# drops the pointer (signals.py). The bodies are content-addressed, so an
+# unchanged invoice never re-renders.
+import hashlib
+import json
+
+from django.core.cache import caches
+
+from .letterhead import letterhead_version
+
+
+CACHE_ALIAS = "invoice_pdfs"
+
+INVOICE_FIELDS = [
+    "invoice_no", "invoice_date", "vat_date", "customer_name", "customer_address",
+    "contract_no", "po_no", "subtotal", "vat", "total",
+]
+ITEM_FIELDS = ["id", "description", "unit", "qty", "unit_rate"]
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def pointer_key(invoice_id):
+    return f"invoice-pdf:{invoice_id}"
+
+
+def body_key(etag):
+    return f"invoice-pdf-body:{etag}"
+
+
+def template_version():
+    # utils (and ReportLab) are imported on first render, not when signals.py loads this module
+    from .utils import PDF_LAYOUT_VERSION
+
+    return f"{PDF_LAYOUT_VERSION}:{letterhead_version() or '-'}"
+
+
+def html_template_version(template_name):
+    """Letterhead version plus a hash of the HTML template's source, for wkhtmltopdf renders."""
+    from django.template.loader import get_template
+
+    source = get_template(template_name).template.source
+    return f"{hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]}:{letterhead_version() or '-'}"
+
+
+def content_hash(invoice, items, renderer="reportlab", template=None):
+    payload = {
+        "renderer": renderer,
+        "template": template or template_version(),
+        "invoice": [str(getattr(invoice, f)) for f in INVOICE_FIELDS],
+        "items": [[str(getattr(item, f)) for f in ITEM_FIELDS] for item in items],
+    }
+    return hashlib.sha256(json.dumps(payload, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def current_etag(invoice):
+    """ETag of the cached PDF for this invoice, or None if it must be recomputed."""
+    pointer = get_cache().get(pointer_key(invoice.pk))
+    if pointer is None:
+        return None
+    version, generation, etag = pointer
+    if version != template_version() or generation != invoice.pdf_generation:
+        return None
+    return etag
+
+
+def invalidate(invoice_id):
+    get_cache().delete(pointer_key(invoice_id))
+
+
+def get_invoice_pdf(invoice):
+    """
+    Return (etag, pdf_bytes) for an invoice, rendering only on a cache miss.
+
+    `invoice` should have its items prefetched.
+    """
+    cache = get_cache()
+    etag = current_etag(invoice)
+    if etag is not None:
+        pdf = cache.get(body_key(etag))
+        if pdf is not None:
+            return etag, pdf
+
+    items = sorted(invoice.items.all(), key=lambda item: item.pk)
+    etag = content_hash(invoice, items)
+    pdf = cache.get(body_key(etag))
+    if pdf is None:
+        from .utils import generate_invoice_pdf
+
+        pdf = generate_invoice_pdf(invoice).getvalue()
+        cache.set(body_key(etag), pdf)
+    cache.set(pointer_key(invoice.pk), (template_version(), invoice.pdf_generation, etag))
+    return etag, pdf
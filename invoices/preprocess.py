@@ -0,0 +1,107 @@
+# invoices/preprocess.py
+# Shrinks scanned/photographed invoices before they are sent to Textract.
+#
+# Phone photos are often 10+ MB of colour JPEG at far more resolution than
+# OCR needs. Images are EXIF-rotated, converted to grayscale, scaled down so
+# a full A4 page comes out at TARGET_DPI and re-encoded as JPEG. PDFs and
+# anything Pillow can't read go through unchanged, as does any image that
+# would not get smaller. Settings: TEXTRACT_PREPROCESS.
+import hashlib
+import io
+import json
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from .metrics import timing
+
+
+DEFAULTS = {
+    "ENABLED": True,
+    "TARGET_DPI": 200,           # Textract recommends at least 150 DPI
+    "PAGE_INCHES": (8.27, 11.69),  # A4; the page is assumed to fill the photo
+    "GRAYSCALE": True,
+    "QUALITY": 80,
+    "MIN_BYTES": 512 * 1024,     # smaller uploads are sent as they are
+}
+
+PreparedDocument = namedtuple("PreparedDocument", ["data", "original_bytes", "changed", "seconds"])
+
+IMAGE_FORMATS = {"JPEG", "PNG", "TIFF", "WEBP", "BMP", "MPO"}
+
+
+def options():
+    return {**DEFAULTS, **getattr(settings, "TEXTRACT_PREPROCESS", {})}
+
+
+def variant():
+    """Short fingerprint of the active settings; part of the Textract cache key."""
+    opts = options()
+    if not opts["ENABLED"]:
+        return ""
+    return hashlib.sha1(json.dumps(opts, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def target_size(width, height, opts):
+    """Largest (width, height) needed for TARGET_DPI, keeping the aspect ratio; never upscales."""
+    short_in, long_in = sorted(opts["PAGE_INCHES"])
+    max_long = int(long_in * opts["TARGET_DPI"])
+    max_short = int(short_in * opts["TARGET_DPI"])
+    long_px, short_px = max(width, height), min(width, height)
+    scale = min(1.0, max_long / long_px, max_short / short_px)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def normalize_image(data, opts=None):
+    """Re-encoded image bytes, or None if `data` isn't a single-frame image Pillow can read."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    opts = opts or options()
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, OSError):
+        return None
+    if image.format not in IMAGE_FORMATS or getattr(image, "n_frames", 1) > 1 and image.format != "MPO":
+        return None
+
+    # EXIF orientation 5-8 swaps width and height
+    orientation = image.getexif().get(0x0112, 1)
+    width, height = image.size if orientation < 5 else image.size[::-1]
+    size = target_size(width, height, opts)
+    mode = "L" if opts["GRAYSCALE"] else "RGB"
+
+    # JPEG can decode straight to a smaller size and to grayscale (DCT scaling), much cheaper than full decode
+    draft_size = size if orientation < 5 else size[::-1]
+    image.draft(mode, draft_size)
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode != mode:
+        image = image.convert(mode)
+    if image.size != size:
+        image = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=opts["QUALITY"], optimize=True)
+    return out.getvalue()
+
+
+def prepare(data):
+    """Bytes to send to Textract for an upload, plus what was saved."""
+    opts = options()
+    start = time.perf_counter()
+    if not opts["ENABLED"] or len(data) < opts["MIN_BYTES"]:
+        return PreparedDocument(data, len(data), False, 0.0)
+
+    from PIL import Image
+
+    with timing("preprocess"):
+        try:
+            normalized = normalize_image(bytes(data), opts)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Truncated or oversized image: Textract may still read the original
+            normalized = None
+    seconds = time.perf_counter() - start
+    if normalized is None or len(normalized) >= len(data):
+        return PreparedDocument(data, len(data), False, seconds)
+    return PreparedDocument(normalized, len(data), True, seconds)
@@ -0,0 +1,121 @@
+# invoices/rendering.py
+# HTML -> PDF rendering with a cap on how many wkhtmltopdf processes run at once.
+#
+# Each render runs wkhtmltopdf as a subprocess, HTML on stdin and PDF on
+# stdout, with a per-job timeout after which the process is killed. (On
+# Linux subprocess uses vfork, so starting it from the Django process is
+# cheap; what needed bounding was concurrency.) At most WORKERS renders run
+# at a time and at most MAX_PENDING more wait for a slot; beyond that, or
+# after waiting TIMEOUT seconds for a slot, RendererBusy is raised and the
+# views answer 503.
+import os
+import subprocess
+import threading
+
+from django.conf import settings
+
+from .metrics import timing
+
+
+DEFAULTS = {
+    "WORKERS": None,  # None: one per CPU core
+    "MAX_PENDING": 64,
+    "TIMEOUT": 60,
+}
+
+# Options shared by every invoice render (A4, no margins, local letterhead image)
+PDF_OPTIONS = {
+    "page-size": "A4",
+    "margin-top": "0mm",
+    "margin-right": "0mm",
+    "margin-bottom": "0mm",
+    "margin-left": "0mm",
+    "encoding": "UTF-8",
+    "enable-local-file-access": None,
+}
+
+
+class RenderError(Exception):
+    pass
+
+
+class RendererBusy(RenderError):
+    pass
+
+
+def _run_wkhtmltopdf(args, html, timeout):
+    try:
+        # run() kills wkhtmltopdf when the timeout expires
+        proc = subprocess.run(args, input=html.encode("utf-8"), capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RenderError(f"wkhtmltopdf timed out after {timeout}s")
+    if proc.returncode != 0 and not proc.stdout.startswith(b"%PDF"):
+        stderr = proc.stderr.decode("utf-8", errors="replace")
+        raise RenderError(f"wkhtmltopdf exited with {proc.returncode}: {stderr}")
+    return proc.stdout
+
+
+def wkhtmltopdf_command(options=None):
+    """The wkhtmltopdf argv pdfkit would use, reading HTML from stdin and writing PDF to stdout."""
+    import pdfkit
+
+    wkhtmltopdf = getattr(settings, "WKHTMLTOPDF_CMD", "")
+    if wkhtmltopdf and os.path.exists(wkhtmltopdf):
+        configuration = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf)
+    else:
+        configuration = pdfkit.configuration()
+    return pdfkit.PDFKit("", "string", options=options, configuration=configuration).command()
+
+
+class PdfRenderer:
+    def __init__(self, workers=None, max_pending=64, timeout=60):
+        self.workers = workers or os.cpu_count() or 2
+        self.timeout = timeout
+        self._admitted = threading.BoundedSemaphore(self.workers + max_pending)
+        self._running = threading.BoundedSemaphore(self.workers)
+        self._commands = {}
+
+    def _command(self, options):
+        key = tuple(sorted((options or {}).items()))
+        command = self._commands.get(key)
+        if command is None:
+            command = self._commands[key] = wkhtmltopdf_command(options)
+        return command
+
+    @timing("wkhtmltopdf")
+    def render(self, html, options=PDF_OPTIONS, timeout=None):
+        """Render `html` to PDF bytes, waiting up to `timeout` for a free slot and as long again for wkhtmltopdf."""
+        timeout = timeout or self.timeout
+        if not self._admitted.acquire(blocking=False):
+            raise RendererBusy("PDF renderer queue is full")
+        try:
+            if not self._running.acquire(timeout=timeout):
+                raise RendererBusy(f"No PDF renderer free within {timeout}s")
+            try:
+                return _run_wkhtmltopdf(self._command(options), html, timeout)
+            finally:
+                self._running.release()
+        finally:
+            self._admitted.release()
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                options = {**DEFAULTS, **getattr(settings, "PDF_RENDERER", {})}
+                _renderer = PdfRenderer(
+                    workers=options["WORKERS"],
+                    max_pending=options["MAX_PENDING"],
+                    timeout=options["TIMEOUT"],
+                )
+    return _renderer
+
+
+def render_pdf(html, options=PDF_OPTIONS, timeout=None):
+    return get_renderer().render(html, options=options, timeout=timeout)
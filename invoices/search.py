@@ -0,0 +1,115 @@
+# invoices/search.py
+# Full-text search over invoices and their line items.
+#
+# On SQLite, two FTS5 tables index the customer name/address and the item
+# descriptions. They are external-content tables (the text lives only in the
+# normal tables) kept in sync by triggers created in migration 0012, so
+# bulk_create, queryset.update() and cascading deletes are all covered.
+# Other databases fall back to icontains.
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Invoice
+
+
+INVOICE_FTS = "invoices_invoice_fts"
+ITEM_FTS = "invoices_item_fts"
+MAX_RESULTS = 200
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Each FTS table hands over its best `candidates` rows (ORDER BY rank LIMIT
+# lets FTS5 keep a small heap instead of sorting every match) before the
+# item rows are joined to their invoices and merged.
+SEARCH_SQL = f"""
+    SELECT invoice_id, MIN(score) AS score FROM (
+        SELECT * FROM (
+            SELECT rowid AS invoice_id, rank AS score FROM {INVOICE_FTS}
+            WHERE {INVOICE_FTS} MATCH %(match)s ORDER BY rank LIMIT %(candidates)s
+        )
+        UNION ALL
+        SELECT item.invoice_id, matched.score FROM (
+            SELECT rowid AS item_id, rank AS score FROM {ITEM_FTS}
+            WHERE {ITEM_FTS} MATCH %(match)s ORDER BY rank LIMIT %(candidates)s
+        ) AS matched JOIN invoices_item AS item ON item.id = matched.item_id
+    )
+    GROUP BY invoice_id
+    ORDER BY score, invoice_id DESC
+    LIMIT %(limit)s
+"""
+
+
+def fts_available():
+    return connection.vendor == "sqlite"
+
+
+def tokens(text):
+    return TOKEN_RE.findall(text or "")
+
+
+def match_expression(text):
+    """
+    Turn free text into an FTS5 query: every word must appear, and each one
+    also matches as a prefix ("cab" finds "cable"). Words are quoted so
+    user input can't inject FTS syntax.
+    """
+    words = tokens(text)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_invoice_ids(text, limit=50):
+    """
+    [(invoice_id, score)] best match first. Lower scores are better (FTS5 rank, i.e. bm25).
+
+    An invoice matches if its customer name/address or one of its item
+    descriptions contains every word of the query.
+    """
+    limit = max(1, min(limit, MAX_RESULTS))
+    expression = match_expression(text)
+    if not expression:
+        return []
+
+    if not fts_available():
+        return icontains_invoice_ids(text, limit)
+    with connection.cursor() as cursor:
+        # Several items of one invoice may match, so over-fetch candidates
+        cursor.execute(SEARCH_SQL, {"match": expression, "candidates": limit * 4, "limit": limit})
+        return cursor.fetchall()
+
+
+def icontains_invoice_ids(text, limit=50):
+    """Unranked LIKE '%word%' scan, used where FTS5 isn't available (and by bench_search)."""
+    invoice_match, item_match = Q(), Q()
+    for word in tokens(text):
+        invoice_match &= Q(customer_name__icontains=word) | Q(customer_address__icontains=word)
+        item_match &= Q(items__description__icontains=word)
+    ids = (
+        Invoice.objects.filter(invoice_match | item_match)
+        .order_by("-id").values_list("id", flat=True).distinct()[:limit]
+    )
+    return [(pk, 0.0) for pk in ids]
+
+
+def search_invoices(text, limit=50):
+    """Invoices (items prefetched) ordered by relevance, each with a `.score`."""
+    ranked = search_invoice_ids(text, limit)
+    invoices = Invoice.objects.prefetch_related("items").in_bulk([pk for pk, _ in ranked])
+    results = []
+    for pk, score in ranked:
+        invoice = invoices[pk]
+        invoice.score = score
+        results.append(invoice)
+    return results
+
+
+def rebuild_index():
+    """Re-read both FTS tables from their content tables and merge their b-trees."""
+    if not fts_available():
+        return False
+    with connection.cursor() as cursor:
+        for table in (INVOICE_FTS, ITEM_FTS):
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    return True
@@ -39,7 +39,30 @@ class InvoiceSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         invoice = Invoice.objects.create(**validated_data)
-        for item_data in items_data:
-            Item.objects.create(invoice=invoice, **item_data)
-        invoice.calculate_totals()
+        items = Item.objects.bulk_create(Item(invoice=invoice, **item_data) for item_data in items_data)
+        invoice.calculate_totals(items)
         return invoice
+
+
+class InvoiceFilterSerializer(serializers.Serializer):
+    """Query parameters accepted by the invoice list endpoint."""
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    customer = serializers.CharField(required=False, allow_blank=False)
+    min_total = serializers.FloatField(required=False)
+    max_total = serializers.FloatField(required=False)
+
+    def filter(self, queryset):
+        data = self.validated_data
+        if "date_from" in data:
+            queryset = queryset.filter(invoice_date__gte=data["date_from"])
+        if "date_to" in data:
+            queryset = queryset.filter(invoice_date__lte=data["date_to"])
+        if "customer" in data:
+            # Exact match so the (customer_name, invoice_date) index can be used
+            queryset = queryset.filter(customer_name=data["customer"])
+        if "min_total" in data:
+            queryset = queryset.filter(total__gte=data["min_total"])
+        if "max_total" in data:
+            queryset = queryset.filter(total__lte=data["max_total"])
+        return queryset
@@ -0,0 +1,20 @@
+# invoices/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import pdf_cache
+from .models import Invoice, Item
+
+
+@receiver([post_save, post_delete], sender=Invoice)
+def invoice_changed(sender, instance, **kwargs):
+    pdf_cache.invalidate(instance.pk)
+
+
+# No post_delete for Item: it would turn off Django's fast delete, so every
+# cascade and bulk item delete would load the rows and hit the cache once per
+# item. On SQLite the item triggers bump Invoice.pdf_generation instead (see
+# pdf_cache.py), which covers deletes made anywhere.
+@receiver(post_save, sender=Item)
+def item_changed(sender, instance, **kwargs):
+    pdf_cache.invalidate(instance.invoice_id)
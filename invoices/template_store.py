@@ -0,0 +1,145 @@
+# invoices/template_store.py
+# Content-addressed storage for uploaded invoice scans.
+#
+# Uploads are still streamed to a fresh name in a single pass (uploads.py),
+# but once the SHA-256 is known the file is registered as a TemplateBlob.
+# If a blob with that digest already exists the new copy is deleted and the
+# existing path returned, so the same scan uploaded a thousand times is kept
+# once. collect_garbage() removes blobs nothing refers to any more; blobs keep
+# no reference count, references are found by scanning invoices, extraction
+# jobs and the Textract cache on every run.
+import hashlib
+import os
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .letterhead import LETTERHEAD_PATH
+from .models import ExtractionJobFile, Invoice, TemplateBlob
+
+
+UPLOAD_DIR = "invoice_templates"
+
+# The default template new invoices point at, even before any invoice exists
+PROTECTED = {f"{UPLOAD_DIR}/{os.path.basename(LETTERHEAD_PATH)}"}
+
+GarbageReport = namedtuple("GarbageReport", ["scanned", "kept", "removed", "bytes_reclaimed", "removed_paths"])
+
+
+def register(path, digest, size):
+    """
+    Record the file just saved at `path` and return the path to use for it.
+
+    For content that is already stored, `path` is deleted and the existing
+    blob's path returned. Bumping last_used keeps a concurrent collect_garbage()
+    from deleting that blob under us.
+    """
+    now = timezone.now()
+    existing = TemplateBlob.objects.filter(digest=digest)
+    if existing.update(last_used=now):
+        stored = existing.values_list("path", flat=True).first()
+        if stored and stored != path and default_storage.exists(stored):
+            default_storage.delete(path)
+            return stored
+        # Row without a file (deleted by hand?): this upload becomes the blob
+        existing.update(path=path, size=size)
+        return path
+
+    try:
+        with transaction.atomic():
+            TemplateBlob.objects.create(digest=digest, path=path, size=size)
+        return path
+    except IntegrityError:
+        # The same scan was registered by another request in the meantime
+        return register(path, digest, size)
+
+
+def live_references(textract_digests=None):
+    """(paths, digests) still in use: invoice templates, extraction jobs and cached Textract responses."""
+    paths = set(
+        Invoice.objects.exclude(template_image="").exclude(template_image__isnull=True)
+        .values_list("template_image", flat=True).distinct()
+    )
+    paths.update(ExtractionJobFile.objects.values_list("template_path", flat=True).distinct())
+    if textract_digests is None:
+        from .textract_cache import get_cache
+
+        textract_digests = get_cache().digests()
+    return paths, set(textract_digests)
+
+
+def collect_garbage(min_age=timedelta(days=1), dry_run=False, include_untracked=False, textract_digests=None):
+    """
+    Delete blobs not referenced by any invoice, extraction job or cached
+    Textract response, and not used within `min_age` (uploads whose extraction
+    the client has not saved yet).
+
+    With include_untracked, files in UPLOAD_DIR that were never registered
+    (saved before deduplication) are held to the same rules.
+    """
+    paths, digests = live_references(textract_digests)
+    cutoff = timezone.now() - min_age
+
+    scanned = kept = removed = reclaimed = 0
+    removed_paths = []
+    for blob in TemplateBlob.objects.order_by("pk").iterator(chunk_size=2000):
+        scanned += 1
+        if blob.path in paths or blob.digest in digests or blob.last_used >= cutoff:
+            kept += 1
+            continue
+
+        if not dry_run:
+            # Only if no upload resolved to it since we read it
+            deleted, _ = TemplateBlob.objects.filter(pk=blob.pk, last_used__lt=cutoff).delete()
+            if not deleted:
+                kept += 1
+                continue
+            if default_storage.exists(blob.path):
+                default_storage.delete(blob.path)
+        removed += 1
+        reclaimed += blob.size
+        removed_paths.append(blob.path)
+
+    if include_untracked:
+        for path, size in untracked_files():
+            scanned += 1
+            if (
+                path in paths or path in PROTECTED
+                or default_storage.get_modified_time(path) >= cutoff
+                or file_digest(path) in digests
+            ):
+                kept += 1
+                continue
+            if not dry_run:
+                default_storage.delete(path)
+            removed += 1
+            reclaimed += size
+            removed_paths.append(path)
+
+    return GarbageReport(scanned, kept, removed, reclaimed, removed_paths)
+
+
+def file_digest(path):
+    sha256 = hashlib.sha256()
+    with default_storage.open(path) as fh:
+        for chunk in fh.chunks():
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def untracked_files():
+    """(path, size) of files in UPLOAD_DIR that are not a registered blob."""
+    tracked = set(TemplateBlob.objects.values_list("path", flat=True))
+    try:
+        _, names = default_storage.listdir(UPLOAD_DIR)
+    except FileNotFoundError:
+        return []
+    files = []
+    for name in names:
+        path = f"{UPLOAD_DIR}/{name}"
+        if path not in tracked:
+            files.append((path, default_storage.size(path)))
+    return files
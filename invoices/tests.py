@@ -1,3 +1,1034 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import zipfile
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import close_old_connections, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import archive, export, metrics, models, pdf_cache, preprocess, textract_cache
+from .batch import create_job, job_status, submit_job
+from .bench import synthetic_invoice_photo, synthetic_invoice_records
+from .importer import import_invoices
+from .item_sync import sync_items
+from .letterhead import LETTERHEAD_PATH, draw_letterhead
+from .pages import split_pages
+from .pagination import decode_cursor, encode_cursor
+from .search import match_expression, search_invoice_ids
+from .rendering import PdfRenderer, RenderError, RendererBusy
+from .template_store import collect_garbage, register
+from .utils import ITEM_CHUNK_SIZE, generate_invoice_pdf
+from .models import (
+    ExtractionJobFile, Invoice, InvoiceSequence, Item, TemplateBlob,
+    allocate_invoice_numbers, format_invoice_no, generate_invoice_no, reserve_invoice_numbers,
+)
+from .textract import TextractDocument, parse_items, parse_number
+from .totals import recompute_all
+
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "invoice_pdfs": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "invoice-pdfs-tests"},
+}
+
+
+def make_invoice(invoice_no="INV-TEST-1", items=((2, 10.0), (1, 5.5))):
+    invoice = Invoice.objects.create(invoice_no=invoice_no, customer_name="Test Customer")
+    created = Item.objects.bulk_create(
+        Item(invoice=invoice, description=f"Line {n}", unit="pcs", qty=qty, unit_rate=rate)
+        for n, (qty, rate) in enumerate(items)
+    )
+    invoice.calculate_totals(created)
+    return invoice
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class InvoicePdfCacheTests(TestCase):
+    def setUp(self):
+        caches["invoice_pdfs"].clear()
+        self.invoice = make_invoice()
+        self.url = f"/api/invoices/{self.invoice.invoice_no}/pdf/"
+
+    def get_etag(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        self.assertIn(response.status_code, (200, 304))
+        return response, response["ETag"]
+
+    def test_unchanged_invoice_is_not_modified(self):
+        _, etag = self.get_etag()
+        response, again = self.get_etag(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(again, etag)
+
+    def test_recompute_retires_pointers_without_cache_calls(self):
+        _, etag = self.get_etag()
+        self.invoice.refresh_from_db()
+        self.assertEqual(pdf_cache.current_etag(self.invoice), etag.strip('"'))
+
+        with mock.patch("invoices.pdf_cache.get_cache") as get_cache:
+            recompute_all()
+        get_cache.assert_not_called()
+        self.invoice.refresh_from_db()
+        self.assertIsNone(pdf_cache.current_etag(self.invoice))
+        # Same totals, so the re-hashed PDF is the same one
+        response, again = self.get_etag(if_none_match=etag)
+        self.assertEqual((response.status_code, again), (304, etag))
+
+    def test_item_changes_outside_item_sync_rerender(self):
+        _, etag = self.get_etag()
+        Item.objects.filter(invoice=self.invoice).update(qty=7)
+        response, updated = self.get_etag(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Like the admin or an ad-hoc cleanup: a fast delete, no signals
+        Item.objects.filter(invoice=self.invoice, description="Line 1").delete()
+        response, deleted = self.get_etag(if_none_match=updated)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len({etag, updated, deleted}), 3)
+
+    def test_layout_version_bump_rerenders(self):
+        _, etag = self.get_etag()
+        with mock.patch("invoices.utils.PDF_LAYOUT_VERSION", 99):
+            response, new_etag = self.get_etag(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(new_etag, etag)
+
+    def test_item_deletes_stay_fast(self):
+        from django.db.models.deletion import Collector
+
+        self.assertTrue(Collector(using="default").can_fast_delete(Item.objects.all()))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SaveInvoiceTests(TransactionTestCase):
+    # Invoice numbers can't be reserved inside TestCase's transaction
+    def test_totals_match_stored_items(self):
+        payload = {"customer_name": "Acme", "items": [{"description": "Cement", "qty": 2.5, "unit_rate": 10}]}
+        response = self.client.post("/api/invoices/save/", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+
+        invoice = Invoice.objects.get()
+        item = invoice.items.get()
+        self.assertEqual((item.qty, item.unit_rate), (2, 10.0))
+        self.assertEqual(invoice.subtotal, 20.0)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        days = [date(2024, 1, 3), date(2024, 1, 2), date(2024, 1, 2), date(2024, 1, 2), date(2024, 1, 1)]
+        Invoice.objects.bulk_create(
+            Invoice(invoice_no=f"INV-PAGE-{n}", invoice_date=day) for n, day in enumerate(days)
+        )
+        self.expected = list(Invoice.objects.order_by("-invoice_date", "-id").values_list("invoice_no", flat=True))
+
+    def test_cursor_round_trip(self):
+        invoice = Invoice.objects.order_by("pk").first()
+        self.assertEqual(decode_cursor(encode_cursor(invoice)), (invoice.invoice_date, invoice.pk))
+
+    def test_pages_follow_on_without_gaps_or_repeats(self):
+        seen, url, pages = [], "/api/invoices/?page_size=2", 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [invoice["invoice_no"] for invoice in response.data["results"]]
+            url, pages = response.data["next"], pages + 1
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(pages, 3)
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ("not-a-cursor", encode_cursor(Invoice(invoice_date=date(2024, 1, 1), pk=1))[:-3], "%FF%FE"):
+            response = self.client.get("/api/invoices/", {"cursor": cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertIn("cursor", response.data)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ItemSyncTests(TestCase):
+    def setUp(self):
+        self.invoice = make_invoice(items=((1, 1.0), (2, 2.0), (3, 3.0)))
+        self.rows = list(self.invoice.items.order_by("pk"))
+
+    def submitted(self, *rows, ids=False):
+        return [
+            {"id": row.pk if ids else None, "description": row.description, "unit": row.unit,
+             "qty": row.qty, "unit_rate": row.unit_rate}
+            for row in rows
+        ]
+
+    def assert_counts(self, sync, created, updated, deleted):
+        self.assertEqual((sync.created, sync.updated, sync.deleted), (created, updated, deleted))
+
+    def test_unchanged_items_write_nothing(self):
+        with self.assertNumQueries(3):  # savepoint, select, release
+            sync = sync_items(self.invoice, self.submitted(*self.rows))
+        self.assert_counts(sync, 0, 0, 0)
+        self.assertEqual([item.pk for item in sync.items], [row.pk for row in self.rows])
+
+    def test_create_update_delete_counts(self):
+        first, second, third = self.submitted(*self.rows, ids=True)
+        second["qty"] = 20
+        sync = sync_items(self.invoice, [second, {"description": "New", "qty": 4, "unit_rate": 4}])
+        # "New" takes over the first leftover row instead of a delete and an insert
+        self.assert_counts(sync, 0, 2, 1)
+        self.assertEqual([item.pk for item in sync.items], [self.rows[1].pk, self.rows[0].pk])
+
+        sync = sync_items(self.invoice, self.submitted(*sync.items) + [{"description": "More", "qty": 5}] * 2)
+        self.assert_counts(sync, 2, 0, 0)
+        self.assertEqual(
+            list(self.invoice.items.order_by("pk").values_list("description", "qty")),
+            [("New", 4), ("Line 1", 20), ("More", 5), ("More", 5)],
+        )
+
+    def test_inserted_line_matches_rest_by_content(self):
+        new = {"description": "Inserted", "qty": 9, "unit_rate": 9}
+        first, second, third = self.submitted(*self.rows)
+        sync = sync_items(self.invoice, [first, new, second, third])
+        self.assert_counts(sync, 1, 0, 0)
+
+        sync = sync_items(self.invoice, [first, second, third])
+        self.assert_counts(sync, 0, 0, 1)
+        self.assertEqual([item.pk for item in sync.items], [row.pk for row in self.rows])
+
+    def test_ids_win_over_position(self):
+        first, second, third = self.submitted(*self.rows, ids=True)
+        third["unit_rate"] = 30
+        sync = sync_items(self.invoice, [third, first, second])
+        self.assert_counts(sync, 0, 1, 0)
+        self.assertEqual([item.pk for item in sync.items], [self.rows[2].pk, self.rows[0].pk, self.rows[1].pk])
+
+    def test_edits_without_ids_fall_back_to_position(self):
+        first, second, third = self.submitted(*self.rows)
+        first["qty"], third["description"] = 10, "Edited"
+        sync = sync_items(self.invoice, [first, second, third])
+        self.assert_counts(sync, 0, 2, 0)
+        self.assertEqual([item.pk for item in sync.items], [row.pk for row in self.rows])
+
+
+class TemplateGarbageTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=tmp.name))
+
+    def store(self, name, data, digest):
+        return register(default_storage.save(f"invoice_templates/{name}", ContentFile(data)), digest, len(data))
+
+    def test_only_unreferenced_blobs_are_collected(self):
+        used = self.store("used.jpg", b"used", "a" * 64)
+        self.assertEqual(self.store("used-again.jpg", b"used", "a" * 64), used)
+        Invoice.objects.bulk_create(
+            Invoice(invoice_no=f"INV-GC-{n}", template_image=used) for n in range(3)
+        )
+        cached = self.store("cached.jpg", b"cached", "b" * 64)
+        unused = self.store("unused.jpg", b"unused", "c" * 64)
+        TemplateBlob.objects.update(last_used=timezone.now() - timedelta(days=2))
+
+        report = collect_garbage(textract_digests=["b" * 64])
+        self.assertEqual((report.scanned, report.kept, report.removed), (3, 2, 1))
+        self.assertEqual(report.removed_paths, [unused])
+        self.assertEqual(
+            sorted(TemplateBlob.objects.values_list("path", flat=True)), sorted([used, cached]),
+        )
+        self.assertFalse(default_storage.exists(unused))
+
+
+def fake_wkhtmltopdf(seconds=0.0, exit_code=0):
+    # Reads HTML on stdin like wkhtmltopdf and answers with a PDF that echoes it
+    script = (
+        "import sys, time; html = sys.stdin.read(); time.sleep(%r); "
+        "sys.stdout.write('%%PDF-1.4 ' + html); sys.exit(%d)" % (seconds, exit_code)
+    )
+    return [sys.executable, "-c", script]
+
+
+class PdfRendererTests(SimpleTestCase):
+    def renderer(self, command, **kwargs):
+        renderer = PdfRenderer(**{"workers": 1, "max_pending": 1, "timeout": 5, **kwargs})
+        renderer._command = lambda options: command
+        return renderer
+
+    def test_renders_from_stdin_to_stdout(self):
+        self.assertEqual(self.renderer(fake_wkhtmltopdf()).render("<p>1</p>"), b"%PDF-1.4 <p>1</p>")
+
+    def test_full_queue_is_busy_immediately(self):
+        renderer = self.renderer(fake_wkhtmltopdf(), max_pending=0)
+        renderer._admitted.acquire()  # one render in progress, none may wait
+        with self.assertRaisesMessage(RendererBusy, "queue is full"):
+            renderer.render("<p>2</p>")
+
+    def test_waiting_for_a_slot_times_out_as_busy(self):
+        renderer = self.renderer(fake_wkhtmltopdf())
+        renderer._running.acquire()  # the only slot is taken
+        with self.assertRaisesMessage(RendererBusy, "No PDF renderer free"):
+            renderer.render("<p>3</p>", timeout=0.2)
+        # The waiter gave its queue place back
+        renderer._running.release()
+        self.assertEqual(renderer.render("<p>3</p>"), b"%PDF-1.4 <p>3</p>")
+
+    def test_slow_render_is_killed(self):
+        renderer = self.renderer(fake_wkhtmltopdf(seconds=30))
+        with self.assertRaisesMessage(RenderError, "timed out"):
+            renderer.render("<p>4</p>", timeout=0.5)
+        self.assertEqual(renderer._running._value, 1)
+
+    def test_failed_render_without_output(self):
+        renderer = self.renderer([sys.executable, "-c", "import sys; sys.stderr.write('boom'); sys.exit(3)"])
+        with self.assertRaisesMessage(RenderError, "exited with 3: boom"):
+            renderer.render("<p>5</p>")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RendererBusyViewTests(TestCase):
+    def test_busy_renderer_answers_503(self):
+        with mock.patch("invoices.api_views.render_pdf", side_effect=RendererBusy("PDF renderer queue is full")):
+            response = self.client.post(
+                "/api/invoices/create-download/", {"invoice_no": "INV-BUSY", "items": []},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 503)
+
+
+def wkhtmltopdf_available():
+    configured = getattr(settings, "WKHTMLTOPDF_CMD", "")
+    return bool(configured and os.path.exists(configured)) or shutil.which("wkhtmltopdf") is not None
+
+
+@unittest.skipUnless(wkhtmltopdf_available(), "wkhtmltopdf is not installed")
+@override_settings(CACHES=LOCMEM_CACHES)
+class ParallelPdfTests(TransactionTestCase):
+    def test_parallel_posts_get_their_own_pdfs(self):
+        # Fails with a CommandError naming the invoices whose PDF was wrong or shared
+        out = io.StringIO()
+        call_command("check_pdf_concurrency", requests=12, threads=6, items=5, stdout=out)
+        self.assertIn("12 distinct PDFs", out.getvalue())
+        self.assertFalse(Invoice.objects.exists())
+
+
+class ImporterTests(TransactionTestCase):
+    # Invoice numbers can't be reserved inside TestCase's transaction
+    def setUp(self):
+        models._reserved_numbers.clear()
+        self.addCleanup(models._reserved_numbers.clear)
+
+    def records(self, count, **fields):
+        return [{**record, **fields} for record in synthetic_invoice_records(count, items_per_invoice=2)]
+
+    def test_invalid_records_are_reported_and_the_rest_saved(self):
+        good, bad, also_good = self.records(3)
+        bad["items"] = [{"description": "No rate", "qty": "lots"}]
+        result = import_invoices([good, bad, also_good])
+        self.assertEqual(len(result["created"]), 2)
+        self.assertEqual([e["index"] for e in result["errors"]], [1])
+        self.assertEqual(Invoice.objects.count(), 2)
+        self.assertEqual(Item.objects.count(), 4)
+        invoice = Invoice.objects.get(invoice_no=result["created"][0])
+        self.assertEqual(invoice.subtotal, sum(i["qty"] * i["unit_rate"] for i in good["items"]))
+
+    def test_duplicate_numbers_in_batch_and_database(self):
+        make_invoice("INV-OLD")
+        records = self.records(3)
+        records[0]["invoice_no"] = records[1]["invoice_no"] = "INV-NEW"
+        records[2]["invoice_no"] = "INV-OLD"
+        result = import_invoices(records)
+        self.assertEqual(result["created"], ["INV-NEW"])
+        self.assertEqual(
+            result["errors"],
+            [{"index": i, "errors": {"invoice_no": ["Invoice number already exists."]}} for i in (1, 2)],
+        )
+
+    def test_supplied_number_colliding_with_allocation(self):
+        supplied = format_invoice_no("INV", date.today(), 1)
+        records = self.records(2)
+        records[0]["invoice_no"] = supplied
+        response = self.client.post("/api/invoices/import/", records, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        created = response.data["created"]
+        self.assertEqual(created[0], supplied)
+        self.assertNotEqual(created[1], supplied)
+        self.assertEqual(response.data["error_count"], 0)
+
+    def test_number_inserted_concurrently_becomes_a_record_error(self):
+        from . import importer
+
+        draw = importer.draw_invoice_numbers
+
+        def draw_then_race(count, reserved):
+            numbers = draw(count, reserved)
+            if not Invoice.objects.filter(invoice_no="INV-RACE").exists():
+                make_invoice("INV-RACE")
+                # ...and an allocated number saved by hand
+                make_invoice(numbers[0])
+            return numbers
+
+        records = self.records(3)
+        records[0]["invoice_no"] = "INV-RACE"
+        with mock.patch.object(importer, "draw_invoice_numbers", draw_then_race):
+            result = import_invoices(records)
+        self.assertEqual([e["index"] for e in result["errors"]], [0])
+        self.assertEqual(len(result["created"]), 2)
+        self.assertEqual(Invoice.objects.count(), 4)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        import_invoices(self.records(1))  # creates today's sequence row
+        counts = []
+        for size in (2, 40):
+            with CaptureQueriesContext(connection) as queries:
+                result = import_invoices(self.records(size))
+            self.assertEqual(len(result["created"]), size)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class InvoiceNumberTests(TransactionTestCase):
+    def setUp(self):
+        models._reserved_numbers.clear()
+        self.addCleanup(models._reserved_numbers.clear)
+
+    def test_unique_across_threads(self):
+        go = threading.Event()
+
+        def allocate(n):
+            go.wait()
+            try:
+                if n % 5 == 0:
+                    return allocate_invoice_numbers(3, prefix="THR")
+                return [generate_invoice_no(prefix="THR") for _ in range(5)]
+            finally:
+                close_old_connections()
+
+        with override_settings(INVOICE_NO_BLOCK_SIZE=4), ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(allocate, n) for n in range(20)]
+            go.set()
+            numbers = [number for future in futures for number in future.result()]
+
+        self.assertEqual(len(numbers), 4 * 3 + 16 * 5)
+        self.assertEqual([n for n, c in Counter(numbers).items() if c > 1], [])
+
+    def test_forked_worker_does_not_reuse_parent_block(self):
+        with override_settings(INVOICE_NO_BLOCK_SIZE=10):
+            parent = generate_invoice_no(prefix="FRK")
+            # The child inherits _reserved_numbers; a new pid must make it reserve its own block
+            with mock.patch("invoices.models.os.getpid", return_value=-1):
+                child = generate_invoice_no(prefix="FRK")
+            again = generate_invoice_no(prefix="FRK")
+        self.assertEqual(parent[-4:], "0001")
+        self.assertEqual(child[-4:], "0011")
+        self.assertEqual(again[-4:], "0021")
+        self.assertEqual(InvoiceSequence.objects.get(prefix="FRK").last_value, 30)
+
+    def test_refuses_to_reserve_inside_a_transaction(self):
+        with transaction.atomic():
+            with self.assertRaises(transaction.TransactionManagementError):
+                reserve_invoice_numbers(1, prefix="ATM")
+        self.assertFalse(InvoiceSequence.objects.filter(prefix="ATM").exists())
+
+    def test_cached_block_is_refused_inside_a_transaction_too(self):
+        with override_settings(INVOICE_NO_BLOCK_SIZE=10):
+            generate_invoice_no(prefix="ATM")
+            with transaction.atomic():
+                with self.assertRaises(transaction.TransactionManagementError):
+                    generate_invoice_no(prefix="ATM")
+
+
+class TextractCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = textract_cache.TextractCache(os.path.join(tmp.name, "cache.sqlite3"), 10 ** 6, 1000)
+
+    def response(self, n, words):
+        # Random-ish text so the compressed size grows with `words`
+        return {"Blocks": [{"Id": f"{n}-{i}", "Text": f"{i * 7919 % 104729:x}"} for i in range(words)]}
+
+    def test_memory_is_capped_by_bytes(self):
+        for n in range(10):
+            self.cache.set(f"k{n}", f"d{n}", self.response(n, 20))
+        stats = self.cache.stats()
+        self.assertLessEqual(stats["memory_bytes"], 1000)
+        self.assertLess(stats["memory_entries"], 10)
+        self.assertEqual(stats["disk_entries"], 10)
+        # Entries that fell out of memory still come back from disk
+        self.assertEqual(self.cache.get("k0"), self.response(0, 20))
+
+    def test_memory_holds_compressed_payloads(self):
+        self.cache.set("k", "d", self.response(0, 20))
+        first, second = self.cache.get("k"), self.cache.get("k")
+        self.assertEqual(first, self.response(0, 20))
+        self.assertIsNot(first, second)
+        self.assertTrue(all(isinstance(payload, bytes) for payload in self.cache._memory.values()))
+        self.assertEqual(self.cache.stats()["memory_bytes"], sum(map(len, self.cache._memory.values())))
+
+    def test_response_larger_than_the_budget_is_not_kept_in_memory(self):
+        self.cache.set("small", "d1", self.response(1, 5))
+        self.cache.set("big", "d2", self.response(2, 2000))
+        stats = self.cache.stats()
+        self.assertEqual(stats["memory_entries"], 1)
+        self.assertEqual(self.cache.get("big"), self.response(2, 2000))
+        self.assertEqual(self.cache.stats()["memory_entries"], 1)
+
+
+class LetterheadTests(SimpleTestCase):
+    def test_letterhead_is_embedded_once_as_jpeg(self):
+        from PIL import Image
+        from pypdf import PdfReader
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=A4)
+        for _ in range(2):
+            self.assertTrue(draw_letterhead(c, *A4))
+            c.showPage()
+        c.save()
+
+        reader = PdfReader(io.BytesIO(buffer.getvalue()))
+        images = {
+            xobject.indirect_reference.idnum: xobject
+            for page in reader.pages
+            for xobject in (x.get_object() for x in page["/Resources"]["/XObject"].values())
+            if xobject["/Subtype"] == "/Image"
+        }
+        self.assertEqual(len(images), 1)
+        (image,) = images.values()
+        self.assertIn("/DCTDecode", image["/Filter"])
+        with Image.open(LETTERHEAD_PATH) as jpeg:
+            self.assertEqual((image["/Width"], image["/Height"]), jpeg.size)
+
+
+class SplitPagesTests(SimpleTestCase):
+    def test_single_page_upload_is_not_copied(self):
+        data = bytearray(synthetic_invoice_photo(width=400, height=300))
+        pages = split_pages(data)
+        self.assertEqual(len(pages), 1)
+        self.assertIs(pages[0], data)
+
+    def test_multi_page_pdf_and_tiff_are_split(self):
+        from PIL import Image
+        from reportlab.pdfgen import canvas
+
+        pdf = io.BytesIO()
+        c = canvas.Canvas(pdf)
+        for n in range(3):
+            c.drawString(100, 100, f"Page {n}")
+            c.showPage()
+        c.save()
+        self.assertEqual(len(split_pages(bytearray(pdf.getvalue()))), 3)
+
+        tiff = io.BytesIO()
+        frames = [Image.new("L", (50, 50), shade) for shade in (0, 128)]
+        frames[0].save(tiff, "TIFF", save_all=True, append_images=frames[1:])
+        pages = split_pages(bytearray(tiff.getvalue()))
+        self.assertEqual(len(pages), 2)
+        self.assertTrue(all(page.startswith(b"\x89PNG") for page in pages))
+
+
+def render_or_crash(invoice):
+    # Replaces archive._render in spawned workers, which import it from here
+    if invoice.invoice_no == "INV-CRASH":
+        os._exit(1)
+    from .utils import generate_invoice_pdf
+
+    return generate_invoice_pdf(invoice).getvalue()
+
+
+class ExportPdfsTests(TestCase):
+    def read_archive(self, queryset):
+        data = b"".join(archive.stream_archive(queryset))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            names = zf.namelist()
+            return names, json.loads(zf.read("manifest.json"))
+
+    def test_names_stay_unique(self):
+        for invoice_no in ("A/1", "A-1", "A-1-2"):
+            make_invoice(invoice_no)
+        with override_settings(PDF_ARCHIVE={"WORKERS": 1}):
+            names, manifest = self.read_archive(Invoice.objects.all())
+        self.addCleanup(archive.reset_executor)
+        self.assertEqual(len(set(names)), 4)
+        files = {entry["invoice_no"]: entry["file"] for entry in manifest["invoices"]}
+        self.assertEqual(files, {"A/1": "A-1.pdf", "A-1": "A-1-2.pdf", "A-1-2": "A-1-2-2.pdf"})
+
+    def test_worker_crash_still_finishes_the_archive(self):
+        # First, so the jobs queued behind it are lost with the pool and more follow
+        make_invoice("INV-CRASH")
+        for n in range(8):
+            make_invoice(f"INV-OK-{n}")
+        self.addCleanup(archive.reset_executor)
+        archive.reset_executor()
+        with override_settings(PDF_ARCHIVE={"WORKERS": 2}), mock.patch.object(archive, "_render", render_or_crash):
+            names, manifest = self.read_archive(Invoice.objects.all())
+
+        self.assertEqual(manifest["failed"], [{"invoice_no": "INV-CRASH", "error": "PDF worker crashed"}])
+        self.assertEqual(manifest["count"], 8)
+        self.assertEqual(sorted(names), [f"INV-OK-{n}.pdf" for n in range(8)] + ["manifest.json"])
+
+    def test_non_object_body_is_rejected(self):
+        for body in (["INV-1"], "INV-1"):
+            response = self.client.post("/api/invoices/export/pdfs/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+
+
+def textract_tables(*tables):
+    """AnalyzeDocument-shaped response with one TABLE per (rows, header_flagged) pair; None skips a cell."""
+    blocks, ids = [], iter(range(10 ** 6))
+    for rows, header_flagged in tables:
+        cell_ids = []
+        for row_index, row in enumerate(rows, start=1):
+            for column_index, text in enumerate(row, start=1):
+                if text is None:
+                    continue
+                cell_id, word_id = f"c{next(ids)}", f"w{next(ids)}"
+                cell = {
+                    "Id": cell_id, "BlockType": "CELL", "RowIndex": row_index, "ColumnIndex": column_index,
+                    "Relationships": [{"Type": "CHILD", "Ids": [word_id]}],
+                }
+                if header_flagged and row_index == 1:
+                    cell["EntityTypes"] = ["COLUMN_HEADER"]
+                blocks += [cell, {"Id": word_id, "BlockType": "WORD", "Text": text}]
+                cell_ids.append(cell_id)
+        blocks.append({"Id": f"t{next(ids)}", "BlockType": "TABLE", "Relationships": [{"Type": "CHILD", "Ids": cell_ids}]})
+    return {"Blocks": blocks}
+
+
+def item(description, unit, qty, unit_rate):
+    return {"description": description, "unit": unit, "qty": qty, "unit_rate": unit_rate}
+
+
+class StubTextract:
+    """analyze_document() answering every scan with one item table; scans containing b"broken" fail."""
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def analyze_document(self, Document, FeatureTypes):
+        with self.lock:
+            self.calls += 1
+        if b"broken" in Document["Bytes"]:
+            raise RuntimeError("Textract rejected the document")
+        return textract_tables(([["Description", "Qty", "Rate", "Amount"], ["Cement", "10", "5,000", "50,000"]], False))
+
+
+class BatchExtractionTests(TransactionTestCase):
+    # process_file() closes its thread's connection, which TestCase's transaction can't survive
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=tmp.name, TEXTRACT_CACHE={"PATH": os.path.join(tmp.name, "textract.sqlite3")},
+        ))
+        self.enterContext(mock.patch.object(textract_cache, "_cache", None))
+
+    def upload(self, name, data):
+        return SimpleUploadedFile(name, data, content_type="image/png")
+
+    def test_batch_with_stub_client(self):
+        with override_settings(INVOICE_UPLOAD_MAX_BYTES=100):
+            job = create_job([
+                self.upload("a.png", b"scan a"),
+                self.upload("b.png", b"scan b"),
+                self.upload("broken.png", b"broken scan"),
+                self.upload("huge.png", b"x" * 101),
+            ])
+        client = StubTextract()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = submit_job(job, client, executor=executor)
+            statuses = sorted(future.result() for future in futures)
+
+        self.assertEqual(statuses, ["done", "done", "failed"])
+        self.assertEqual(client.calls, 3)  # the oversized upload never reached Textract
+
+        report = job_status(job)
+        self.assertEqual(report["status"], "done")
+        self.assertEqual(report["counts"], {"pending": 0, "running": 0, "done": 2, "failed": 2})
+        files = {f["name"]: f for f in report["files"]}
+        self.assertEqual(files["a.png"]["result"]["items"], [{**item("Cement", "", 10, 5000.0), "page": 1}])
+        self.assertTrue(files["a.png"]["result"]["template_path"].startswith("invoice_templates/a_"))
+        self.assertIn("rejected", files["broken.png"]["error"])
+        self.assertIn("byte limit", files["huge.png"]["error"])
+
+    def test_resubmitting_skips_finished_files(self):
+        job = create_job([self.upload("a.png", b"scan a")])
+        client = StubTextract()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            [future.result() for future in submit_job(job, client, executor=executor)]
+            self.assertEqual(submit_job(job, client, executor=executor), [])
+        self.assertEqual(job.files.get().status, ExtractionJobFile.DONE)
+        self.assertEqual(client.calls, 1)
+
+
+class TableParserTests(SimpleTestCase):
+    def parse(self, *tables):
+        return parse_items(TextractDocument(textract_tables(*tables)))
+
+    def test_header_row_maps_columns_and_skips_totals(self):
+        items = self.parse(
+            ([
+                ["S/N", "Item No", "Description", "Qty", "Unit", "Unit Price", "Amount"],
+                ["1", "A-1", "Copper pipe", "3", "m", "1,250.00", "3,750.00"],
+                ["2", "A-2", "Valve", None, "pcs", "NGN 300", "0"],
+                ["", "", "", "", "", "", ""],
+                ["", "", "Subtotal", "", "", "", "4,050.00"],
+            ], False),
+            ([["Subtotal", "4,050.00"], ["VAT", "303.75"], ["Total", "4,353.75"]], False),
+        )
+        self.assertEqual(items, [item("Copper pipe", "m", 3.0, 1250.0), item("Valve", "pcs", 0.0, 300.0)])
+
+    def test_textract_column_header_flag(self):
+        items = self.parse(([["Particulars", "UOM", "Quantity", "Rate"], ["Labour", "hrs", "8", "(45.50)"]], True))
+        self.assertEqual(items, [item("Labour", "hrs", 8.0, -45.5)])
+
+    def test_headerless_invoice_template_layout(self):
+        # counter | description | unit | qty | rate | amount, as invoice_template.html prints it
+        items = self.parse(([
+            ["1", "Cement", "bags", "10", "5000", "50000"],
+            ["2", "Sand", "tons", "3", "12000.50", "36001.50"],
+        ], False))
+        self.assertEqual(items, [item("Cement", "bags", 10.0, 5000.0), item("Sand", "tons", 3.0, 12000.5)])
+
+    def test_headerless_continuation_page_single_row(self):
+        items = self.parse(([["21", "Cement", "bags", "10", "5000", "50000"]], False))
+        self.assertEqual(items, [item("Cement", "bags", 10.0, 5000.0)])
+
+    def test_headerless_four_columns(self):
+        items = self.parse(([["Cable 10mm", "m", "120", "4.5"], ["Clips", "box", "2", "900"]], False))
+        self.assertEqual(items, [item("Cable 10mm", "m", 120.0, 4.5), item("Clips", "box", 2.0, 900.0)])
+
+    def test_parse_number(self):
+        self.assertEqual(
+            [parse_number(t) for t in ["1,250.00", "NGN 300", "(45.50)", "", "abc", "-3", "inf"]],
+            [1250.0, 300.0, -45.5, 0.0, 0.0, -3.0, 0.0],
+        )
+
+
+class SearchTests(TestCase):
+    def ids(self, text):
+        return [pk for pk, _ in search_invoice_ids(text)]
+
+    def test_triggers_index_inserts_and_updates(self):
+        invoice = make_invoice("INV-S1")
+        Item.objects.create(invoice=invoice, description="Copper cable", unit="m", qty=1, unit_rate=1)
+        self.assertEqual(self.ids("copper"), [invoice.id])
+        self.assertEqual(self.ids("test customer"), [invoice.id])
+
+        Item.objects.filter(invoice=invoice).update(description="Steel rod")
+        Invoice.objects.filter(pk=invoice.pk).update(customer_name="Acme Ltd", customer_address="12 Marina Road")
+        self.assertEqual(self.ids("copper"), [])
+        self.assertEqual(self.ids("test customer"), [])
+        self.assertEqual(self.ids("steel"), [invoice.id])
+        self.assertEqual(self.ids("acme"), [invoice.id])
+        self.assertEqual(self.ids("marina"), [invoice.id])
+
+    def test_triggers_unindex_bulk_and_cascade_deletes(self):
+        kept, dropped = make_invoice("INV-S1"), make_invoice("INV-S2")
+        Item.objects.filter(invoice=kept).delete()
+        self.assertEqual(self.ids("line"), [dropped.id])
+
+        dropped.delete()
+        self.assertEqual(self.ids("line"), [])
+        self.assertEqual(self.ids("test customer"), [kept.id])
+
+    def test_prefix_match_and_rank_order(self):
+        weak = make_invoice("INV-S1")
+        Item.objects.create(invoice=weak, description="Cable clips and a long list of other fittings", unit="box", qty=1, unit_rate=1)
+        strong = make_invoice("INV-S2")
+        Item.objects.create(invoice=strong, description="Cable cable cable", unit="m", qty=1, unit_rate=1)
+        make_invoice("INV-S3")
+
+        ranked = search_invoice_ids("cab")
+        self.assertEqual([pk for pk, _ in ranked], [strong.id, weak.id])
+        self.assertLess(ranked[0][1], ranked[1][1])
+
+        response = self.client.get("/api/invoices/search/", {"q": "cab"})
+        self.assertEqual([row["invoice_no"] for row in response.json()["results"]], ["INV-S2", "INV-S1"])
+
+    def test_fts_syntax_in_query_is_quoted(self):
+        invoice = make_invoice("INV-S1")
+        self.assertEqual(match_expression('line" OR customer:* NEAR(x'), '"line"* "OR"* "customer"* "NEAR"* "x"*')
+        for query in ['"', "line OR nothing", "customer_name:test", "line*", "NOT line", "(line", "^line"]:
+            with self.subTest(query=query):
+                search_invoice_ids(query)
+        self.assertEqual(self.ids("line OR nothing"), [])
+        self.assertEqual(self.ids("(line"), [invoice.id])
+        self.assertEqual(self.ids('"*:^()'), [])
+
+    def test_rebuild_search_index_command(self):
+        invoice = make_invoice("INV-S1")
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO invoices_item_fts(invoices_item_fts) VALUES ('delete-all')")
+        self.assertEqual(self.ids("line"), [])
+
+        out = io.StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Search index rebuilt", out.getvalue())
+        self.assertEqual(self.ids("line"), [invoice.id])
+
+
+class LedgerExportTests(TestCase):
+    def setUp(self):
+        self.first = make_invoice("INV-E1", items=((2, 10.0), (3, 1.25)))
+        self.empty = Invoice.objects.create(invoice_no="INV-E2", customer_name="No Items Ltd")
+        self.last = make_invoice("INV-E3", items=((1, 99.99),))
+
+    def export(self, fmt, **params):
+        response = self.client.get("/api/invoices/export/", {"format": fmt, **params})
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_has_one_row_per_item_and_per_empty_invoice(self):
+        response, body = self.export("csv")
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(list(rows[0]), export.CSV_HEADER)
+        self.assertEqual(
+            [(r["invoice_no"], r["item_description"], r["item_qty"], r["item_amount"]) for r in rows],
+            [("INV-E1", "Line 0", "2", "20.0"), ("INV-E1", "Line 1", "3", "3.75"),
+             ("INV-E2", "", "", ""), ("INV-E3", "Line 0", "1", "99.99")],
+        )
+        self.assertEqual(rows[2]["customer_name"], "No Items Ltd")
+        self.assertEqual(rows[0]["invoice_date"], self.first.invoice_date.isoformat())
+
+    def test_jsonl_nests_items_per_invoice(self):
+        response, body = self.export("jsonl")
+        self.assertTrue(response["Content-Type"].startswith("application/x-ndjson"))
+        records = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([r["invoice_no"] for r in records], ["INV-E1", "INV-E2", "INV-E3"])
+        self.assertEqual(records[0]["items"], [
+            {"description": "Line 0", "unit": "pcs", "qty": 2, "unit_rate": 10.0, "amount": 20.0},
+            {"description": "Line 1", "unit": "pcs", "qty": 3, "unit_rate": 1.25, "amount": 3.75},
+        ])
+        self.assertEqual(records[1]["items"], [])
+        self.assertEqual(records[2]["total"], self.last.total)
+
+    def test_gzip_export_decompresses_to_plain_output(self):
+        for fmt in export.FORMATS:
+            with self.subTest(fmt=fmt):
+                _, plain = self.export(fmt)
+                response, compressed = self.export(fmt, gzip="1")
+                self.assertEqual(response["Content-Type"], "application/gzip")
+                self.assertIn(f'invoices.{fmt}.gz"', response["Content-Disposition"])
+                self.assertEqual(gzip.decompress(compressed), plain)
+
+    def test_small_flushes_give_the_same_output(self):
+        for fmt in export.FORMATS:
+            with self.subTest(fmt=fmt):
+                whole = b"".join(export.export_stream(fmt))
+                with mock.patch.object(export, "FLUSH_BYTES", 10):
+                    pieces = list(export.export_stream(fmt))
+                self.assertGreater(len(pieces), 2)
+                self.assertEqual(b"".join(pieces), whole)
+
+    def test_one_joined_query(self):
+        for fmt in export.FORMATS:
+            with self.subTest(fmt=fmt), self.assertNumQueries(1):
+                b"".join(export.export_stream(fmt, gzip=True))
+
+
+class InvoiceLayoutTests(TestCase):
+    def pages(self, invoice):
+        from pypdf import PdfReader
+
+        return [page.extract_text() for page in PdfReader(generate_invoice_pdf(invoice)).pages]
+
+    def test_long_invoice_runs_over_pages_with_forwarded_subtotals(self):
+        invoice = make_invoice("INV-LONG", items=[(n % 3 + 1, 2.5 + n) for n in range(70)])
+        amounts = [(n % 3 + 1) * (2.5 + n) for n in range(70)]
+        pages = self.pages(invoice)
+
+        self.assertEqual(len(pages), 3)
+        running, drawn = 0.0, 0
+        for number, text in enumerate(pages, 1):
+            with self.subTest(page=number):
+                heading = "Invoice: INV-LONG" + (" (continued)" if number > 1 else "")
+                self.assertTrue(text.startswith(heading + "\n"))
+                self.assertIn("Description\nUnit\nQty\nUnit Rate\nAmount\n", text)
+                self.assertTrue(text.endswith(f"Page {number} of \n{len(pages)}\n"))
+
+                brought = re.search(r"Brought forward\n([\d,.]+)", text)
+                if number == 1:
+                    self.assertIsNone(brought)
+                else:
+                    self.assertEqual(brought.group(1), f"{running:,.2f}")
+
+                rows = [int(n) for n in re.findall(r"^Line (\d+) ", text, re.MULTILINE)]
+                self.assertEqual(rows, list(range(drawn, drawn + len(rows))))
+                drawn += len(rows)
+                running += sum(amounts[n] for n in rows)
+
+                carried = re.search(r"Carried forward\n([\d,.]+)", text)
+                if number == len(pages):
+                    self.assertIsNone(carried)
+                    self.assertIn(f"Subtotal: {invoice.subtotal:,.2f}", text)
+                else:
+                    self.assertEqual(carried.group(1), f"{running:,.2f}")
+        self.assertEqual(drawn, 70)
+        self.assertAlmostEqual(running, invoice.subtotal)
+
+    def test_short_invoice_fits_one_page(self):
+        (text,) = self.pages(make_invoice())
+        self.assertNotIn("forward", text)
+        self.assertTrue(text.endswith("Page 1 of \n1\n"))
+
+    def test_items_are_streamed_unless_prefetched(self):
+        from django.db.models.query import QuerySet
+
+        make_invoice("INV-LONG", items=[(1, 1.0)] * 40)
+        with mock.patch.object(QuerySet, "iterator", autospec=True, side_effect=QuerySet.iterator) as iterator:
+            self.pages(Invoice.objects.get(invoice_no="INV-LONG"))
+            iterator.assert_called_once_with(mock.ANY, chunk_size=ITEM_CHUNK_SIZE)
+
+            iterator.reset_mock()
+            invoice = Invoice.objects.prefetch_related("items").get(invoice_no="INV-LONG")
+            with self.assertNumQueries(0):
+                pages = self.pages(invoice)
+            iterator.assert_not_called()
+        self.assertEqual(len(pages), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncViewTests(TransactionTestCase):
+    # extract() closes its offload thread's connection, which TestCase's transaction can't survive
+    def setUp(self):
+        caches["invoice_pdfs"].clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=tmp.name, TEXTRACT_CACHE={"PATH": os.path.join(tmp.name, "textract.sqlite3")},
+        ))
+        self.enterContext(mock.patch.object(textract_cache, "_cache", None))
+        self.client_stub = StubTextract()
+        self.enterContext(mock.patch("invoices.async_views.get_textract_client", return_value=self.client_stub))
+
+    def upload(self, data):
+        return SimpleUploadedFile("scan.png", data, content_type="image/png")
+
+    async def test_async_extract_with_stub_client(self):
+        response = await self.async_client.post("/api/invoices/async/extract/", {"file": self.upload(b"scan a")})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["items"], [{**item("Cement", "", 10, 5000.0), "page": 1}])
+        self.assertTrue(data["template_path"].startswith("invoice_templates/scan_"))
+        self.assertEqual(self.client_stub.calls, 1)
+        self.assertIn("textract;dur=", response["Server-Timing"])
+
+        response = await self.async_client.post("/api/invoices/async/extract/", {"file": self.upload(b"broken scan")})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("rejected", response.json()["error"])
+
+    async def test_async_extract_rejects_oversized_upload(self):
+        with override_settings(INVOICE_UPLOAD_MAX_BYTES=100):
+            response = await self.async_client.post("/api/invoices/async/extract/", {"file": self.upload(b"x" * 101)})
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("byte limit", response.json()["error"])
+        self.assertEqual(self.client_stub.calls, 0)
+
+    async def test_async_pdf_conditional_get(self):
+        invoice = await sync_to_async(make_invoice)()
+        url = f"/api/invoices/async/{invoice.invoice_no}/pdf/"
+
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF"))
+        etag = response["ETag"]
+
+        with mock.patch.object(pdf_cache, "get_invoice_pdf") as get_pdf:
+            response = await self.async_client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        get_pdf.assert_not_called()
+
+        response = await self.async_client.get("/api/invoices/async/INV-MISSING/pdf/")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsTests(TestCase):
+    def setUp(self):
+        caches["invoice_pdfs"].clear()
+
+    def series(self, name, labels):
+        text = self.client.get("/metrics").content.decode()
+        match = re.search(rf"^{name}{{{re.escape(labels)}}} (\S+)$", text, re.MULTILINE)
+        return float(match.group(1)) if match else 0.0
+
+    def test_server_timing_header_and_histograms(self):
+        make_invoice()
+        labels = 'view="invoice_pdf",method="GET",status="200"'
+        before = self.series("invoice_http_request_seconds_count", labels)
+
+        response = self.client.get("/api/invoices/INV-TEST-1/pdf/")
+        self.assertEqual(response.status_code, 200)
+        timings = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertRegex(timings["db"], r'^dur=\d+\.\d;desc="\d+ queries"$')
+        self.assertRegex(timings["reportlab"], r"^dur=\d+\.\d$")
+        self.assertRegex(timings["total"], r"^dur=\d+\.\d$")
+        self.assertEqual(list(timings)[-1], "total")
+
+        self.assertEqual(self.series("invoice_http_request_seconds_count", labels), before + 1)
+        response = self.client.get("/metrics")
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertIn("# TYPE invoice_http_request_seconds histogram", text)
+        self.assertIn("# TYPE invoice_db_queries_per_request histogram", text)
+        buckets = [
+            float(value) for value in re.findall(
+                rf'^invoice_http_request_seconds_bucket{{{re.escape(labels)},le="[^"]+"}} (\S+)$', text, re.MULTILINE,
+            )
+        ]
+        self.assertEqual(len(buckets), len(metrics.DURATION_BUCKETS) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], before + 1)
+        self.assertGreaterEqual(self.series("invoice_operation_seconds_count", 'operation="reportlab"'), 1)
+
+    def test_histogram_exposition(self):
+        histogram = metrics.Histogram("demo_seconds", "Demo.", ("view",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, view='a"b')
+        self.assertEqual(histogram.expose().splitlines(), [
+            "# HELP demo_seconds Demo.",
+            "# TYPE demo_seconds histogram",
+            'demo_seconds_bucket{view="a\\"b",le="0.1"} 2',
+            'demo_seconds_bucket{view="a\\"b",le="1.0"} 3',
+            'demo_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'demo_seconds_sum{view="a\\"b"} 2.65',
+            'demo_seconds_count{view="a\\"b"} 4',
+        ])
+
+
+class PreprocessTests(SimpleTestCase):
+    def test_phone_photo_is_shrunk(self):
+        photo = synthetic_invoice_photo(width=2000, height=1500, seed=1)
+        with override_settings(TEXTRACT_PREPROCESS={"MIN_BYTES": 0}):
+            prepared = preprocess.prepare(photo)
+        self.assertTrue(prepared.changed)
+        self.assertLess(len(prepared.data), len(photo))
+
+    def test_undecodable_images_are_sent_unchanged(self):
+        truncated = synthetic_invoice_photo(width=2000, height=1500, seed=1)[:-20000]
+        with override_settings(TEXTRACT_PREPROCESS={"MIN_BYTES": 0}):
+            self.assertEqual(preprocess.prepare(truncated).data, truncated)
+            with mock.patch("PIL.Image.MAX_IMAGE_PIXELS", 1000):
+                photo = synthetic_invoice_photo(width=2000, height=1500, seed=2)
+                self.assertEqual(preprocess.prepare(photo).data, photo)
@@ -0,0 +1,317 @@
+# invoices/textract.py
+# Parsing of AWS Textract AnalyzeDocument responses.
+#
+# Textract returns a flat list of blocks that reference each other by Id.
+# Everything here indexes that list once, so walking KEY_VALUE_SET and TABLE
+# structures is linear in the number of blocks.
+import math
+import re
+from array import array
+from datetime import datetime
+
+
+# Key text (lower-cased) -> invoice_data field, checked in order
+FIELD_RULES = [
+    (("invoice no",), "invoice_no"),
+    (("invoice date",), "invoice_date"),
+    (("vat date",), "vat_date"),
+    (("customer", "sold"), "customer_name"),
+    (("address",), "customer_address"),
+    (("contract",), "contract_no"),
+    (("po",), "po_no"),
+]
+
+
+class TextractDocument:
+    """Id -> block index plus relationship maps for one Textract response."""
+
+    def __init__(self, response):
+        self.blocks = response.get("Blocks", []) or []
+        self.by_id = {}
+        self.children = {}
+        self.values = {}
+
+        for block in self.blocks:
+            block_id = block.get("Id")
+            self.by_id[block_id] = block
+            for rel in block.get("Relationships", []) or []:
+                rel_type = rel.get("Type")
+                if rel_type == "CHILD":
+                    self.children.setdefault(block_id, []).extend(rel.get("Ids", []))
+                elif rel_type == "VALUE":
+                    self.values.setdefault(block_id, []).extend(rel.get("Ids", []))
+
+    def blocks_of_type(self, block_type):
+        return (b for b in self.blocks if b.get("BlockType") == block_type)
+
+    def child_blocks(self, block_id):
+        by_id = self.by_id
+        return [by_id[cid] for cid in self.children.get(block_id, ()) if cid in by_id]
+
+    def text(self, block_id):
+        words = []
+        for child in self.child_blocks(block_id):
+            if child.get("BlockType") == "WORD":
+                words.append(child.get("Text", ""))
+            elif child.get("BlockType") == "SELECTION_ELEMENT" and child.get("SelectionStatus") == "SELECTED":
+                words.append("X")
+        return " ".join(words).strip()
+
+    def key_values(self):
+        """Yield (key_text, value_text) for every KEY entity in the document."""
+        for block in self.blocks_of_type("KEY_VALUE_SET"):
+            if "KEY" not in (block.get("EntityTypes") or []):
+                continue
+            key_id = block.get("Id")
+            value_text = " ".join(
+                t for t in (self.text(vid) for vid in self.values.get(key_id, ())) if t
+            )
+            yield self.text(key_id), value_text
+
+
+def parse_fields(doc):
+    fields = {}
+    for key_text, value_text in doc.key_values():
+        key_text = key_text.lower()
+        for needles, field in FIELD_RULES:
+            if all(n in key_text for n in needles):
+                fields[field] = value_text
+                break
+    return fields
+
+
+# -----------------------------
+# Line item tables
+# -----------------------------
+# Header text (lower-cased) -> Item field. The first rule a header matches
+# wins, and earlier rules beat later ones when two columns claim a field
+# ("Description" over "Item No").
+HEADER_RULES = [
+    (("description",), "description"),
+    (("particular",), "description"),
+    (("item",), "description"),
+    (("qty",), "qty"),
+    (("quantity",), "qty"),
+    (("rate",), "unit_rate"),
+    (("price",), "unit_rate"),
+    (("unit",), "unit"),
+    (("uom",), "unit"),
+]
+NUMERIC_FIELDS = ("qty", "unit_rate")
+INFER_SAMPLE = 50  # cells per column looked at to tell text from numbers
+SUMMARY_LABELS = ("subtotal", "sub total", "sub-total", "total", "grand total", "vat", "tax", "amount due")
+
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_number(text):
+    """Amount in a table cell: "1,250.00", "NGN 300", "(45.50)" (negative); 0.0 if none."""
+    try:
+        value = float(text)  # most cells are plain numbers
+        if math.isfinite(value):
+            return value
+    except ValueError:
+        pass
+    match = NUMBER_RE.search(text.replace(",", ""))
+    if match is None:
+        return 0.0
+    value = float(match.group())
+    if text.startswith("(") and text.endswith(")"):
+        value = -abs(value)
+    return value
+
+
+def is_numeric(text):
+    return NUMBER_RE.fullmatch(text.replace(",", "").strip("()").strip()) is not None
+
+
+class Table:
+    """
+    One TABLE block as a grid: columns[c][r] is the text of the cell at
+    RowIndex r + 1, ColumnIndex c + 1 ("" where Textract returned no cell).
+    """
+
+    def __init__(self, n_rows, n_cols):
+        self.n_rows = n_rows
+        self.columns = [[""] * n_rows for _ in range(n_cols)]
+        self.header_rows = set()
+        self._numbers = {}
+
+    @classmethod
+    def from_block(cls, doc, table):
+        cells = [c for c in doc.child_blocks(table.get("Id")) if c.get("BlockType") == "CELL"]
+        if not cells:
+            return None
+        grid = cls(
+            max(c.get("RowIndex", 1) for c in cells),
+            max(c.get("ColumnIndex", 1) for c in cells),
+        )
+        for cell in cells:
+            row, col = cell.get("RowIndex", 1) - 1, cell.get("ColumnIndex", 1) - 1
+            grid.columns[col][row] = doc.text(cell["Id"])
+            if "COLUMN_HEADER" in (cell.get("EntityTypes") or []):
+                grid.header_rows.add(row)
+        return grid
+
+    def header_row(self):
+        """Index of the header row, or None. Uses Textract's COLUMN_HEADER, else the first row naming two fields."""
+        if self.header_rows:
+            return max(self.header_rows)
+        for row in range(min(2, self.n_rows)):
+            if len({header_field(col[row])[1] for col in self.columns} - {None}) >= 2:
+                return row
+        return None
+
+    def field_columns(self, header):
+        """Item field -> column index."""
+        if header is not None:
+            best = {}
+            for index, column in enumerate(self.columns):
+                rank, field = header_field(column[header])
+                if field and (field not in best or rank < best[field][0]):
+                    best[field] = (rank, index)
+            mapping = {field: index for field, (rank, index) in best.items()}
+            if any(field in mapping for field in NUMERIC_FIELDS):
+                return mapping
+        return self.infer_columns(0 if header is None else header + 1)
+
+    def infer_columns(self, first_row):
+        """
+        Mapping for tables without a usable header (e.g. continuation pages):
+        description is the first text column, qty the first whole-number column
+        to its right, unit_rate the next numeric column and unit a text column
+        between them. A leading serial-number column (1, 2, 3... as printed by
+        invoice_template.html) is never qty.
+        """
+        numeric, text = [], []
+        for index, column in enumerate(self.columns):
+            values = [v for v in column[first_row:] if v][:INFER_SAMPLE]
+            if not values:
+                continue
+            share = sum(map(is_numeric, values)) / len(values)
+            (numeric if share >= 0.8 else text).append(index)
+
+        mapping = {}
+        if text:
+            mapping["description"] = text[0]
+            numeric = [i for i in numeric if i > text[0]]
+        elif numeric and self.is_serial(numeric[0], first_row):
+            numeric = numeric[1:]
+        whole = [i for i in numeric if all(float(n).is_integer() for n in self.numbers(i, first_row))]
+        if whole:
+            mapping["qty"] = whole[0]
+            rates = [i for i in numeric if i > whole[0]]
+            if rates:
+                mapping["unit_rate"] = rates[0]
+            units = [i for i in text[1:] if i < whole[0]]
+            if units:
+                mapping["unit"] = units[0]
+        return mapping
+
+    def is_serial(self, index, first_row):
+        """True if the column's filled cells count up by one (1, 2, 3... or 21, 22... on later pages)."""
+        values = [n for n, text in zip(self.numbers(index, first_row), self.columns[index][first_row:]) if text]
+        return bool(values) and all(b - a == 1 for a, b in zip(values, values[1:]))
+
+    def numbers(self, index, first_row=0):
+        """Column `index` parsed as amounts in one pass (once per column)."""
+        key = (index, first_row)
+        if key not in self._numbers:
+            self._numbers[key] = array("d", map(parse_number, self.columns[index][first_row:]))
+        return self._numbers[key]
+
+    def items(self):
+        """Yield Item dicts (description, unit, qty, unit_rate), one per line item row."""
+        header = self.header_row()
+        first_row = 0 if header is None else header + 1
+        mapping = self.field_columns(header)
+        if "qty" not in mapping and "unit_rate" not in mapping:
+            return  # not a line item table (totals, bank details, ...)
+
+        blank = [""] * (self.n_rows - first_row)
+        zeros = array("d", [0.0]) * len(blank)
+        descriptions = self.columns[mapping["description"]][first_row:] if "description" in mapping else blank
+        units = self.columns[mapping["unit"]][first_row:] if "unit" in mapping else blank
+        qtys = self.numbers(mapping["qty"], first_row) if "qty" in mapping else zeros
+        rates = self.numbers(mapping["unit_rate"], first_row) if "unit_rate" in mapping else zeros
+
+        for description, unit, qty, rate in zip(descriptions, units, qtys, rates):
+            if not description and not qty and not rate:
+                continue
+            if not qty and description.lower().rstrip(":").strip() in SUMMARY_LABELS:
+                continue
+            yield {"description": description, "unit": unit, "qty": qty, "unit_rate": rate}
+
+
+def header_field(text):
+    """(rule rank, Item field) for a header cell, or (None, None)."""
+    text = text.lower()
+    if text:
+        for rank, (needles, field) in enumerate(HEADER_RULES):
+            if all(n in text for n in needles):
+                return rank, field
+    return None, None
+
+
+def parse_items(doc):
+    """Item dicts from every line item table, in document order."""
+    items = []
+    for table in doc.blocks_of_type("TABLE"):
+        grid = Table.from_block(doc, table)
+        if grid is not None:
+            items.extend(grid.items())
+    return items
+
+
+def parse_response(response):
+    """Return (fields, items) extracted from an AnalyzeDocument response."""
+    doc = TextractDocument(response)
+    return parse_fields(doc), parse_items(doc)
+
+
+def invoice_data_from_response(response):
+    """Shape an AnalyzeDocument response into the payload returned by the extract endpoints."""
+    return invoice_data_from_pages([parse_response(response)])
+
+
+def invoice_data_from_pages(pages):
+    """
+    Merge the (fields, items) parsed from each page of a document, in page order.
+
+    A field takes the value from the first page that has it; items keep their
+    order and each records its "page" (1-based). "field_pages" maps every field
+    found to its page.
+    """
+    fields, field_pages, items = {}, {}, []
+    for page, (page_fields, page_items) in enumerate(pages, start=1):
+        for field, value in page_fields.items():
+            if field not in fields:
+                fields[field] = value
+                field_pages[field] = page
+        items.extend({**item, "page": page} for item in page_items)
+
+    invoice_data = {
+        "invoice_no": "",
+        "invoice_date": "",
+        "vat_date": "",
+        "customer_name": "",
+        "customer_address": "",
+        "contract_no": "",
+        "po_no": "",
+    }
+    invoice_data.update(fields)
+    invoice_data["items"] = items
+    invoice_data["page_count"] = len(pages)
+    invoice_data["field_pages"] = field_pages
+
+    subtotal = sum(i["qty"] * i["unit_rate"] for i in items)
+    vat = round(subtotal * 0.075, 2)
+    invoice_data["subtotal"] = subtotal
+    invoice_data["vat"] = vat
+    invoice_data["total"] = round(subtotal + vat, 2)
+
+    now = datetime.now()
+    invoice_data["invoice_date"] = invoice_data["invoice_date"] or now.date().isoformat()
+    invoice_data["vat_date"] = invoice_data["vat_date"] or invoice_data["invoice_date"]
+    invoice_data["invoice_no"] = invoice_data["invoice_no"] or f"INV-{now.strftime('%Y%m%d%H%M%S')}"
+    return invoice_data
@@ -0,0 +1,202 @@
+# invoices/textract_cache.py
+# Content-addressed cache of Textract AnalyzeDocument responses.
+#
+# Entries are keyed by the SHA-256 of the uploaded bytes plus the requested
+# FeatureTypes and the preprocessing variant. A small in-process LRU sits in
+# front of an SQLite file that is shared by every worker on the host; both
+# hold the compressed responses and are trimmed to a byte budget, since one
+# 50-page response weighs as much as hundreds of one-page ones. A memory hit
+# still decompresses: decoded, a response takes up to ~200x its compressed
+# size, so the in-process budget would mean nothing otherwise.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .metrics import timing
+from .preprocess import prepare, variant as preprocess_variant
+
+
+FEATURE_TYPES = ["TABLES", "FORMS"]
+
+DEFAULTS = {
+    "PATH": os.path.join(settings.BASE_DIR, "textract_cache.sqlite3"),
+    "MAX_BYTES": 256 * 1024 * 1024,
+    "MEMORY_BYTES": 8 * 1024 * 1024,
+}
+
+
+def cache_key(digest, feature_types, variant=""):
+    key = f"{digest}:{','.join(sorted(feature_types))}"
+    # `variant` identifies the preprocessing applied before the call
+    return f"{key}:{variant}" if variant else key
+
+
+def decode(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+class TextractCache:
+    def __init__(self, path, max_bytes, memory_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._memory = OrderedDict()  # key -> (response, compressed size)
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL,"
+                " accessed REAL NOT NULL, response BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, payload):
+        with self._lock:
+            self._forget(key)
+            if len(payload) > self.memory_bytes:
+                return
+            self._memory[key] = payload
+            self._memory_size += len(payload)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _forget(self, key):
+        # Caller holds self._lock
+        payload = self._memory.pop(key, None)
+        if payload is not None:
+            self._memory_size -= len(payload)
+
+    def get(self, key):
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+        if payload is not None:
+            return decode(payload)
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT response FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._remember(key, row[0])
+        with self._lock:
+            self.hits += 1
+        return decode(row[0])
+
+    def set(self, key, digest, response):
+        payload = zlib.compress(json.dumps(response, default=str).encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, digest, size, accessed, response) VALUES (?, ?, ?, ?, ?)",
+                (key, digest, len(payload), time.time(), payload),
+            )
+            self._evict(conn)
+        self._remember(key, payload)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            with self._lock:
+                self._forget(key)
+                self.evictions += 1
+
+    def digests(self):
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT DISTINCT digest FROM entries")}
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": entries,
+                "disk_bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                options = {**DEFAULTS, **getattr(settings, "TEXTRACT_CACHE", {})}
+                _cache = TextractCache(options["PATH"], options["MAX_BYTES"], options["MEMORY_BYTES"])
+    return _cache
+
+
+def analyze_document(client, file_bytes, feature_types=FEATURE_TYPES, digest=None, preprocess=True):
+    """
+    AnalyzeDocument through the cache; only a miss reaches AWS.
+
+    Entries stay keyed by the digest of the upload as received; on a miss the
+    bytes are shrunk by preprocess.prepare() before they are sent.
+    """
+    digest = digest or hashlib.sha256(file_bytes).hexdigest()
+    key = cache_key(digest, feature_types, preprocess_variant() if preprocess else "")
+    cache = get_cache()
+
+    response = cache.get(key)
+    if response is None:
+        if preprocess:
+            file_bytes = prepare(file_bytes).data
+        with timing("textract"):
+            response = client.analyze_document(
+                Document={"Bytes": file_bytes},
+                FeatureTypes=list(feature_types),
+            )
+        response.pop("ResponseMetadata", None)
+        cache.set(key, digest, response)
+    return response
@@ -0,0 +1,88 @@
+# invoices/totals.py
+# Invoice subtotal / VAT / total computation.
+#
+# Write paths that have just built their items pass them in and the totals
+# are computed in memory. Without items the subtotal is aggregated in the
+# database, and recompute_all() fixes whole tables with set-based UPDATEs.
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import F, FloatField, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+
+
+VAT_RATE = 0.075
+CENT = Decimal("0.01")
+
+
+def round_money(amount):
+    # Half-up like SQL ROUND(), so in-memory and recomputed totals agree on
+    # half-cent ties (Python's round() would give 1213.12 for 1213.125)
+    return float(Decimal(repr(round(amount, 9))).quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def _value(item, name):
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def compute_totals(items):
+    """(subtotal, vat, total) for Item instances or item dicts."""
+    return totals_from_subtotal(
+        sum(float(_value(i, "qty") or 0) * float(_value(i, "unit_rate") or 0) for i in items)
+    )
+
+
+def totals_from_subtotal(subtotal):
+    vat = round_money(subtotal * VAT_RATE)
+    return subtotal, vat, round_money(subtotal + vat)
+
+
+def line_total():
+    return F("qty") * F("unit_rate")
+
+
+def aggregate_subtotal(invoice):
+    """Sum the invoice's line totals in the database without loading the items."""
+    from .models import Item
+
+    result = Item.objects.filter(invoice=invoice).aggregate(
+        subtotal=Coalesce(Sum(line_total(), output_field=FloatField()), Value(0.0))
+    )
+    return result["subtotal"]
+
+
+def recompute_all(queryset=None, batch_size=50_000):
+    """
+    Recompute subtotal, VAT and total for every invoice in `queryset`.
+
+    Works through primary key ranges of `batch_size`, two UPDATE statements per
+    range, each range in its own transaction. Returns the number of invoices updated.
+    UPDATEs send no signals, so the second one also bumps pdf_generation, which
+    retires every cached PDF pointer of the range without touching the cache.
+    """
+    from .models import Invoice, Item
+
+    queryset = Invoice.objects.all() if queryset is None else queryset
+    bounds = queryset.order_by().aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return 0
+
+    item_subtotal = (
+        Item.objects.filter(invoice=OuterRef("pk"))
+        .order_by()
+        .values("invoice")
+        .annotate(subtotal=Sum(line_total(), output_field=FloatField()))
+        .values("subtotal")
+    )
+    vat = Round(F("subtotal") * VAT_RATE, 2)
+
+    updated = 0
+    for lo in range(bounds["lo"], bounds["hi"] + 1, batch_size):
+        batch = queryset.filter(pk__gte=lo, pk__lt=lo + batch_size)
+        with transaction.atomic():
+            updated += batch.update(subtotal=Coalesce(Subquery(item_subtotal), Value(0.0)))
+            batch.update(
+                vat=vat, total=Round(F("subtotal") + vat, 2), pdf_generation=F("pdf_generation") + 1,
+            )
+    return updated
+
@@ -0,0 +1,100 @@
+# invoices/uploads.py
+# Persisting uploaded invoice scans under MEDIA_ROOT/invoice_templates/.
+#
+# An upload is read exactly once: each chunk is size-checked, hashed, kept for
+# the Textract call and written to storage as it streams past, so nothing has
+# to reopen the saved file afterwards. Duplicate scans are then folded into
+# the stored copy (template_store.py).
+import hashlib
+import os
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .template_store import UPLOAD_DIR, register
+
+
+DEFAULT_MAX_BYTES = 25 * 1024 * 1024
+
+StoredUpload = namedtuple("StoredUpload", ["path", "digest", "size", "data"])
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def max_upload_bytes():
+    return getattr(settings, "INVOICE_UPLOAD_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+
+class _StreamingUpload(File):
+    """File wrapper whose chunks() hashes, size-checks and buffers what storage writes."""
+
+    def __init__(self, uploaded_file, max_bytes, keep_data):
+        super().__init__(uploaded_file, name=uploaded_file.name)
+        self.max_bytes = max_bytes
+        self.keep_data = keep_data
+        self.sha256 = None
+        self.received = 0
+        self.data = None
+
+    def _reset(self):
+        self.sha256 = hashlib.sha256()
+        self.received = 0
+        self.data = None
+        # Preallocate when the client told us the size, so the buffer never regrows
+        if self.keep_data:
+            self.data = bytearray(self.file.size or 0)
+
+    def chunks(self, chunk_size=None):
+        # Storage backends may restart the copy (e.g. on a name clash)
+        self._reset()
+        for chunk in self.file.chunks(chunk_size):
+            start = self.received
+            self.received += len(chunk)
+            if self.received > self.max_bytes:
+                raise UploadTooLarge(f"Upload exceeds the {self.max_bytes:,} byte limit")
+            self.sha256.update(chunk)
+            if self.keep_data:
+                self.data[start:self.received] = chunk
+            yield chunk
+        if self.keep_data:
+            del self.data[self.received:]
+
+
+def store_upload(uploaded_file, keep_data=True, max_bytes=None):
+    """
+    Save an uploaded scan under a unique name in a single pass.
+
+    Returns a StoredUpload with the storage path, SHA-256, size and (unless
+    keep_data is False) the bytes that were written. A scan that is already
+    stored resolves to the existing file (template_store.register()).
+    """
+    max_bytes = max_bytes or max_upload_bytes()
+    if uploaded_file.size is not None and uploaded_file.size > max_bytes:
+        raise UploadTooLarge(f"Upload exceeds the {max_bytes:,} byte limit")
+
+    stem, ext = os.path.splitext(uploaded_file.name)
+    save_path = os.path.join(UPLOAD_DIR, f"{stem}_{uuid.uuid4().hex}{ext}")
+
+    stream = _StreamingUpload(uploaded_file, max_bytes, keep_data)
+    try:
+        path = default_storage.save(save_path, stream)
+    except UploadTooLarge:
+        if default_storage.exists(save_path):
+            default_storage.delete(save_path)
+        raise
+
+    digest = stream.sha256.hexdigest()
+    path = register(path, digest, stream.received)
+    return StoredUpload(path, digest, stream.received, stream.data)
+
+
+def template_fields(path):
+    return {
+        "template_url": settings.MEDIA_URL + path,
+        "template_path": path,
+    }
@@ -1,8 +1,21 @@
 from django.urls import path
-from . import api_views
+from . import api_views, async_views
 
 urlpatterns = [
+    path('', api_views.list_invoices, name='list_invoices'),
+    path('search/', api_views.search_invoices_view, name='search_invoices'),
+    path('export/', api_views.export_invoices, name='export_invoices'),
+    path('export/pdfs/', api_views.export_invoice_pdfs, name='export_invoice_pdfs'),
     path('extract/', api_views.extract_invoice, name='extract_invoice'),
+    path('extract/batch/', api_views.extract_invoice_batch, name='extract_invoice_batch'),
+    path('extract/batch/<uuid:job_id>/', api_views.extract_batch_status, name='extract_batch_status'),
     path('save/', api_views.save_invoice, name='save_invoice'),
+    path('import/', api_views.bulk_import_invoices, name='bulk_import_invoices'),
     path('create-download/', api_views.create_and_download_invoice, name='create_and_download_invoice'),
+    path('<str:invoice_no>/pdf/', api_views.invoice_pdf, name='invoice_pdf'),
+
+    # Async variants for ASGI deployments (see async_views.py)
+    path('async/extract/', async_views.extract_invoice, name='async_extract_invoice'),
+    path('async/create-download/', async_views.create_and_download_invoice, name='async_create_and_download_invoice'),
+    path('async/<str:invoice_no>/pdf/', async_views.invoice_pdf, name='async_invoice_pdf'),
 ]
@@ -1,40 +1,187 @@
 from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 from io import BytesIO
 
+from .letterhead import draw_letterhead
+from .metrics import timing
+
+# Bump whenever generate_invoice_pdf's layout changes, so cached PDFs are re-rendered
+PDF_LAYOUT_VERSION = 2
+
+# Item table layout (points). Columns: description, unit, qty, unit rate, amount
+COLUMNS = [50, 250, 350, 400, 500]
+DESCRIPTION_WIDTH = COLUMNS[1] - COLUMNS[0] - 10
+ROW_HEIGHT = 20
+BOTTOM_MARGIN = 60
+TOTALS_HEIGHT = 80
+ITEM_CHUNK_SIZE = 2000
+
+
+def invoice_items(invoice):
+    """Prefetched items if the caller loaded them, otherwise streamed from the database in id order."""
+    if "items" in getattr(invoice, "_prefetched_objects_cache", {}):
+        return invoice.items.all()
+    return invoice.items.order_by("id").iterator(chunk_size=ITEM_CHUNK_SIZE)
+
+
+def fit_text(text, width, font="Helvetica", size=12):
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + "...", font, size) > width:
+        text = text[:-1]
+    return text + "..."
+
+
+class InvoiceLayout:
+    """
+    Draws the item table over as many pages as it needs.
+
+    Every page repeats the table header; pages after the first start with the
+    subtotal brought forward and every page that breaks ends with the subtotal
+    carried forward. Rows are drawn as they arrive, so only the current page
+    is held in memory.
+    """
+
+    def __init__(self, c, invoice):
+        self.c = c
+        self.invoice = invoice
+        self.width, self.height = A4
+        self.page = 0
+        self.running = 0.0
+        self.y = None
+        self.rows = None
+
+    def start_page(self):
+        c, height = self.c, self.height
+        self.page += 1
+        if self.page == 1:
+            c.setFont("Helvetica-Bold", 16)
+            c.drawString(50, height - 50, f"Invoice: {self.invoice.invoice_no}")
+            c.setFont("Helvetica", 12)
+            c.drawString(50, height - 80, f"Invoice Date: {self.invoice.invoice_date}")
+            c.drawString(50, height - 100, f"Customer: {self.invoice.customer_name}")
+            c.drawString(50, height - 120, f"Address: {self.invoice.customer_address}")
+            y = height - 160
+        else:
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(50, height - 50, f"Invoice: {self.invoice.invoice_no} (continued)")
+            c.setFont("Helvetica", 12)
+            y = height - 80
+
+        c.drawString(COLUMNS[0], y, "Description")
+        c.drawString(COLUMNS[1], y, "Unit")
+        c.drawString(COLUMNS[2], y, "Qty")
+        c.drawString(COLUMNS[3], y, "Unit Rate")
+        c.drawString(COLUMNS[4], y, "Amount")
+        c.line(COLUMNS[0], y - 5, self.width - 40, y - 5)
+        y -= ROW_HEIGHT
+
+        if self.page > 1:
+            c.drawString(COLUMNS[0], y, "Brought forward")
+            c.drawString(COLUMNS[4], y, f"{self.running:,.2f}")
+            y -= ROW_HEIGHT
+        self.y = y
+
+    def end_page(self, carried=True):
+        c = self.c
+        self.flush_rows()
+        if carried:
+            c.drawString(COLUMNS[0], self.y, "Carried forward")
+            c.drawString(COLUMNS[4], self.y, f"{self.running:,.2f}")
+        c.setFont("Helvetica", 9)
+        label = f"Page {self.page} of "
+        c.drawString(self.width - 110, 30, label)
+        # The page count is only known at the end; every page shows the same form
+        c.saveState()
+        c.translate(self.width - 110 + stringWidth(label, "Helvetica", 9), 30)
+        c.doForm("page_count")
+        c.restoreState()
+        c.showPage()
+
+    def ensure_space(self, needed):
+        # Leave room for the "Carried forward" row below the last item
+        if self.y - needed < BOTTOM_MARGIN + ROW_HEIGHT:
+            self.end_page()
+            self.start_page()
+
+    def draw_item(self, item):
+        self.ensure_space(ROW_HEIGHT)
+        y = self.y
+        amount = item.qty * item.unit_rate
+        # One text object per page instead of one per drawString call
+        if self.rows is None:
+            self.rows = self.c.beginText()
+        rows = self.rows
+        for x, text in zip(COLUMNS, (
+            fit_text(item.description, DESCRIPTION_WIDTH),
+            item.unit,
+            str(item.qty),
+            str(item.unit_rate),
+            str(round(amount, 2)),
+        )):
+            rows.setTextOrigin(x, y)
+            rows.textOut(text)
+        self.running += amount
+        self.y -= ROW_HEIGHT
+
+    def flush_rows(self):
+        if self.rows is not None:
+            self.c.drawText(self.rows)
+            self.rows = None
+
+    def draw_totals(self):
+        self.ensure_space(TOTALS_HEIGHT)
+        self.flush_rows()
+        c, y = self.c, self.y
+        c.drawString(400, y - 20, f"Subtotal: {self.invoice.subtotal:,.2f}")
+        c.drawString(400, y - 40, f"VAT (7.5%): {self.invoice.vat:,.2f}")
+        c.drawString(400, y - 60, f"Total: {self.invoice.total:,.2f}")
+        self.end_page(carried=False)
+
+    def finish(self):
+        self.c.beginForm("page_count")
+        self.c.setFont("Helvetica", 9)
+        self.c.drawString(0, 0, str(self.page))
+        self.c.endForm()
+
+
+@timing("reportlab")
 def generate_invoice_pdf(invoice):
     buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
+    c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+
+    layout = InvoiceLayout(c, invoice)
+    layout.start_page()
+    for item in invoice_items(invoice):
+        layout.draw_item(item)
+    layout.draw_totals()
+    layout.finish()
 
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, height - 50, f"Invoice: {invoice.invoice_no}")
-    c.setFont("Helvetica", 12)
-    c.drawString(50, height - 80, f"Invoice Date: {invoice.invoice_date}")
-    c.drawString(50, height - 100, f"Customer: {invoice.customer_name}")
-    c.drawString(50, height - 120, f"Address: {invoice.customer_address}")
-
-    # Table header
-    c.drawString(50, height - 160, "Description")
-    c.drawString(250, height - 160, "Unit")
-    c.drawString(350, height - 160, "Qty")
-    c.drawString(400, height - 160, "Unit Rate")
-    c.drawString(500, height - 160, "Amount")
-
-    y = height - 180
-    for item in invoice.items.all():
-        c.drawString(50, y, item.description)
-        c.drawString(250, y, item.unit)
-        c.drawString(350, y, str(item.qty))
-        c.drawString(400, y, str(item.unit_rate))
-        c.drawString(500, y, str(round(item.qty * item.unit_rate, 2)))
-        y -= 20
-
-    c.drawString(400, y - 20, f"Subtotal: {invoice.subtotal}")
-    c.drawString(400, y - 40, f"VAT (7.5%): {invoice.vat}")
-    c.drawString(400, y - 60, f"Total: {invoice.total}")
-
-    c.showPage()
     c.save()
     buffer.seek(0)
     return buffer
+
+
+@timing("reportlab")
+def generate_letterhead_pdf(invoice):
+    """One-page invoice summary printed over the company letterhead."""
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    draw_letterhead(p, width, height)
+
+    p.setFont("Helvetica", 10)
+    p.drawString(400, 800, f"Invoice No: {invoice.invoice_no}")
+    p.drawString(400, 785, f"Invoice Date: {invoice.invoice_date}")
+    p.drawString(50, 750, f"Customer: {invoice.customer_name}")
+    p.drawString(50, 735, f"Address: {invoice.customer_address}")
+    p.drawString(400, 100, f"Subtotal: {invoice.subtotal:,.2f}")
+    p.drawString(400, 85, f"VAT (7.5%): {invoice.vat:,.2f}")
+    p.drawString(400, 70, f"Total: {invoice.total:,.2f}")
+
+    p.showPage()
+    p.save()
+    buffer.seek(0)
+    return buffer
@@ -1,12 +1,17 @@
-import pdfkit
 from django.http import HttpResponse
-from django.template.loader import render_to_string
 from django.views.decorators.csrf import csrf_exempt
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.conf import settings
+from django.db import transaction
 import os, json
-from .models import Invoice, Item
+from . import pdf_cache
+from .api_views import invoice_template_context, render_template_pdf
+from .item_sync import sync_items
+from .models import Invoice
+from .rendering import RendererBusy
+
+TEMPLATE_NAME = "invoices/invoice_template.html"
 
 @method_decorator(csrf_exempt, name='dispatch')
 class GenerateInvoicePdfView(View):
@@ -14,62 +19,51 @@ class GenerateInvoicePdfView(View):
         try:
             data = json.loads(request.body.decode('utf-8'))
 
-            # Extract or create invoice
-            invoice, created = Invoice.objects.get_or_create(
-                invoice_no=data.get("invoice_no"),
-                defaults={
-                    "customer_name": data.get("customer_name", ""),
-                    "customer_address": data.get("customer_address", ""),
-                    "contract_no": data.get("contract_no", ""),
-                    "po_no": data.get("po_no", ""),
-                },
-            )
-
-            # Clear existing items before re-adding
-            invoice.items.all().delete()
-
-            # Add line items
-            for item_data in data.get("items", []):
-                Item.objects.create(
-                    invoice=invoice,
-                    description=item_data.get("description", ""),
-                    unit=item_data.get("unit", ""),
-                    qty=item_data.get("qty", 0),
-                    unit_rate=item_data.get("unit_rate", 0.0),
+            with transaction.atomic():
+                # Extract or create invoice
+                invoice, created = Invoice.objects.get_or_create(
+                    invoice_no=data.get("invoice_no"),
+                    defaults={
+                        "customer_name": data.get("customer_name", ""),
+                        "customer_address": data.get("customer_address", ""),
+                        "contract_no": data.get("contract_no", ""),
+                        "po_no": data.get("po_no", ""),
+                    },
                 )
+                # Regenerations of the same invoice take turns
+                invoice = Invoice.objects.select_for_update().get(pk=invoice.pk)
 
-            # Calculate totals
-            invoice.calculate_totals()
-
-            # Render the invoice HTML template
-            html_content = render_to_string("invoices/invoice_template.html", {"invoice": invoice})
+                # Update only the items that changed (see item_sync.py)
+                sync = sync_items(invoice, data.get("items", []))
+                if created or sync.created or sync.updated or sync.deleted:
+                    invoice.calculate_totals(sync.items)
 
-            # Output file path
-            output_path = os.path.join(settings.BASE_DIR, "generated_invoice.pdf")
-
-            # PDF options (A4, no margins)
-            options = {
-                "page-size": "A4",
-                "margin-top": "0mm",
-                "margin-right": "0mm",
-                "margin-bottom": "0mm",
-                "margin-left": "0mm",
-                "encoding": "UTF-8",
-                "enable-local-file-access": "",
-            }
-
-            # Generate PDF with pdfkit
-            pdfkit.from_string(html_content, output_path, options=options)
+            # Unchanged invoices are served from the PDF cache instead of re-rendered
+            etag = pdf_cache.content_hash(
+                invoice, sync.items, renderer="wkhtmltopdf",
+                template=pdf_cache.html_template_version(TEMPLATE_NAME),
+            )
+            cache = pdf_cache.get_cache()
+            pdf_bytes = cache.get(pdf_cache.body_key(etag))
+            if pdf_bytes is not None:
+                return self.pdf_response(invoice, etag, pdf_bytes)
 
-            # Return PDF as response
-            with open(output_path, "rb") as pdf:
-                response = HttpResponse(pdf.read(), content_type="application/pdf")
-                response["Content-Disposition"] = f'inline; filename="{invoice.invoice_no}.pdf"'
-                return response
+            # Rendered straight to bytes on wkhtmltopdf's stdout: no shared output file
+            pdf_bytes = render_template_pdf(invoice_template_context(invoice, sync.items))
+            cache.set(pdf_cache.body_key(etag), pdf_bytes)
+            return self.pdf_response(invoice, etag, pdf_bytes)
 
+        except RendererBusy as e:
+            return HttpResponse(str(e), status=503)
         except Exception as e:
             return HttpResponse(f"Error generating invoice PDF: {str(e)}", status=400)
 
+    def pdf_response(self, invoice, etag, pdf_bytes):
+        response = HttpResponse(pdf_bytes, content_type="application/pdf")
+        response["Content-Disposition"] = f'inline; filename="{invoice.invoice_no}.pdf"'
+        response["ETag"] = f'"{etag}"'
+        return response
+
 from django.conf import settings
 
 template_path = os.path.join(settings.BASE_DIR, 'invoices', 'ISMADTECHNICAL_TEMPLATE.jpg')